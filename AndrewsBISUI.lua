@@ -1568,13 +1568,297 @@ function ABIS:ShowBISItems()
     self:CreateCharacterPanel()
 end
 
+-- Map Wowhead slot names to addon slot names
+local IMPORT_SLOT_MAP = {
+    ["Head"] = "Head",
+    ["Neck"] = "Neck",
+    ["Shoulders"] = "Shoulders",
+    ["Cloak"] = "Cloak",
+    ["Chest"] = "Chest",
+    ["Wrists"] = "Wrists",
+    ["Hands"] = "Gloves",
+    ["Waist"] = "Belt",
+    ["Legs"] = "Legs",
+    ["Feet"] = "Boots",
+    ["Finger 1"] = "Ring1",
+    ["Finger 2"] = "Ring2",
+    ["Trinket 1"] = "Trinket1",
+    ["Trinket 2"] = "Trinket2",
+    ["Main Hand"] = "MainHand",
+    ["Off Hand"] = "OffHand",
+    -- Alternative items - keep original slot name with (Alternative) marker
+    ["Trinket (Alternative)"] = "Trinket (Alternative)",
+    ["Finger (Alternative)"] = "Finger (Alternative)",
+    ["Main Hand (Alternative)"] = "Main Hand (Alternative)",
+}
+
+-- Build an imported item entry from a Wowhead slot name and item ID
+local function MakeImportItem(slot, itemID)
+    local addonSlot = IMPORT_SLOT_MAP[slot] or slot
+    local isAlternative = string.match(slot, "%(Alternative%)") ~= nil
+    return {slot = addonSlot, itemID = itemID, isAlternative = isAlternative}
+end
+
+-- Slot names with a fixed index in compact (ABIS1:) import strings
+-- Must match COMPACT_SLOTS in api_server.py (only ever appended to)
+local COMPACT_SLOTS = {
+    "Head", "Neck", "Shoulders", "Cloak", "Chest", "Wrists", "Hands", "Waist",
+    "Legs", "Feet", "Finger 1", "Finger 2", "Trinket 1", "Trinket 2", "Main Hand",
+    "Off Hand", "Trinket (Alternative)", "Finger (Alternative)", "Main Hand (Alternative)",
+    "Bracers", "Boots", "Ring", "Weapon", "Two-Hand",
+}
+
+local BASE64URL_VALUES = {}
+do
+    local alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    for i = 1, #alphabet do
+        BASE64URL_VALUES[string.byte(alphabet, i)] = i - 1
+    end
+end
+
+-- Decode unpadded base64url into a list of byte values (nil on bad input)
+local function DecodeBase64URL(text)
+    local bytes = {}
+    local buffer, bits = 0, 0
+    for i = 1, #text do
+        local value = BASE64URL_VALUES[string.byte(text, i)]
+        if not value then
+            return nil
+        end
+        buffer = buffer * 64 + value
+        bits = bits + 6
+        if bits >= 8 then
+            bits = bits - 8
+            local scale = 2 ^ bits
+            bytes[#bytes + 1] = math.floor(buffer / scale)
+            buffer = buffer % scale
+        end
+    end
+    return bytes
+end
+
+-- Reader over the varint-packed data of compact and delta import strings:
+-- reads the string table, then callers read their sections in order.
+-- Errors are raised with error(message, 0) - call it inside pcall
+local function NewCompactReader(bytes)
+    local reader = {}
+    local pos = 1
+    local strings = {}
+
+    function reader.varint()
+        local value, scale = 0, 1
+        while true do
+            local byte = bytes[pos]
+            if not byte then
+                error("import string is incomplete", 0)
+            end
+            pos = pos + 1
+            value = value + (byte % 128) * scale
+            if byte < 128 then
+                return value
+            end
+            scale = scale * 128
+        end
+    end
+
+    function reader.delta()
+        local value = reader.varint()
+        if value % 2 == 0 then
+            return value / 2
+        end
+        return -(value + 1) / 2
+    end
+
+    function reader.slot()
+        local index = reader.varint()
+        local slot = COMPACT_SLOTS[index + 1] or strings[index - #COMPACT_SLOTS + 1]
+        if not slot then
+            error("unknown slot " .. index, 0)
+        end
+        return slot
+    end
+
+    -- Enchant slots as a list of {slot = ..., options = {{id, context}, ...}}
+    function reader.enchants()
+        local entries = {}
+        local enchantID = 0
+        for _ = 1, reader.varint() do
+            local slot = reader.slot()
+            local enchantOptions = {}
+            for _ = 1, reader.varint() do
+                enchantID = enchantID + reader.delta()
+                local context = reader.varint()
+                table.insert(enchantOptions, {id = enchantID, context = context > 0 and (strings[context] or "") or ""})
+            end
+            table.insert(entries, {slot = slot, options = enchantOptions})
+        end
+        return entries
+    end
+
+    for i = 1, reader.varint() do
+        local length = reader.varint()
+        if pos + length - 1 > #bytes then
+            error("import string is incomplete", 0)
+        end
+        strings[i] = length > 0 and string.char(unpack(bytes, pos, pos + length - 1)) or ""
+        pos = pos + length
+    end
+
+    return reader
+end
+
+-- Decode a compact import string payload (the part after "ABIS1:")
+-- Layout (varints): strings, gear (slot, zigzag id delta), enchants
+-- (slot, options: zigzag id delta, context) - see build_compact_import_string
+-- Returns items, enchants or nil, nil, error message
+local function DecodeCompactImport(payload)
+    local bytes = DecodeBase64URL(payload)
+    if not bytes then
+        return nil, nil, "invalid characters"
+    end
+
+    local ok, items, enchants = pcall(function()
+        local reader = NewCompactReader(bytes)
+
+        local items = {}
+        local itemID = 0
+        for _ = 1, reader.varint() do
+            local slot = reader.slot()
+            itemID = itemID + reader.delta()
+            table.insert(items, MakeImportItem(slot, itemID))
+        end
+
+        local enchants = {}
+        for _, entry in ipairs(reader.enchants()) do
+            if #entry.options > 0 then
+                enchants[entry.slot] = entry.options
+            end
+        end
+        return items, enchants
+    end)
+
+    if not ok then
+        return nil, nil, items
+    end
+    return items, enchants
+end
+
+-- Decode a delta import string payload (the part after "ABISD1:<base>:<new>:")
+-- Layout (varints): strings, gear slots (slot, item count, zigzag id deltas),
+-- enchants as in compact strings - see build_delta_import_string
+-- Returns gear changes ({slot, itemIDs}), enchant changes ({slot, options})
+-- or nil, nil, error message. Empty itemIDs/options mean the slot is gone
+local function DecodeImportDelta(payload)
+    local bytes = DecodeBase64URL(payload)
+    if not bytes then
+        return nil, nil, "invalid characters"
+    end
+
+    local ok, gearChanges, enchantChanges = pcall(function()
+        local reader = NewCompactReader(bytes)
+
+        local gearChanges = {}
+        local itemID = 0
+        for _ = 1, reader.varint() do
+            local slot = reader.slot()
+            local itemIDs = {}
+            for _ = 1, reader.varint() do
+                itemID = itemID + reader.delta()
+                table.insert(itemIDs, itemID)
+            end
+            table.insert(gearChanges, {slot = slot, itemIDs = itemIDs})
+        end
+        return gearChanges, reader.enchants()
+    end)
+
+    if not ok then
+        return nil, nil, gearChanges
+    end
+    return gearChanges, enchantChanges
+end
+
+-- Apply decoded delta changes to a BiS set in place: the items of every
+-- changed slot are replaced where the old ones were, enchant slots are
+-- replaced or removed
+local function ApplyImportDelta(bisData, gearChanges, enchantChanges)
+    local items = bisData.items
+    for _, change in ipairs(gearChanges) do
+        local addonSlot = IMPORT_SLOT_MAP[change.slot] or change.slot
+        local position = #items + 1
+        for i = #items, 1, -1 do
+            if items[i].slot == addonSlot then
+                table.remove(items, i)
+                position = i
+            end
+        end
+        for offset, itemID in ipairs(change.itemIDs) do
+            table.insert(items, position + offset - 1, MakeImportItem(change.slot, itemID))
+        end
+    end
+
+    bisData.enchants = bisData.enchants or {}
+    for _, change in ipairs(enchantChanges) do
+        bisData.enchants[change.slot] = #change.options > 0 and change.options or nil
+    end
+end
+
+-- Apply a delta import string (ABISD1:) to the current BiS set, which must
+-- be the import it was made for
+function ABIS:ImportDelta(baseHash, newHash, payload)
+    local bisData = self.CurrentBISSet and self.BISData[self.CurrentBISSet]
+    if not bisData or bisData.importHash ~= baseHash then
+        print("|cFFFF0000This update was made for a different BiS set than your current one - paste the full import string instead|r")
+        return
+    end
+
+    local gearChanges, enchantChanges, err = DecodeImportDelta(payload)
+    if not gearChanges then
+        print("|cFFFF0000Invalid import string: " .. err .. "|r")
+        return
+    end
+
+    -- The set is the same table as the one in SavedVariables, so this persists
+    ApplyImportDelta(bisData, gearChanges, enchantChanges)
+    bisData.importHash = newHash
+
+    print("|cFF00FF00Updated " .. #gearChanges .. " gear slots and " .. #enchantChanges .. " enchant slots!|r")
+
+    if self.characterPanel then
+        self:RefreshCharacterPanel()
+    end
+end
+
 -- Function to import item IDs manually
 function ABIS:ImportItemIDs(importString)
     local items = {}
     local enchants = {}
 
+    -- Delta update of the current set: ABISD1:<base hash>:<new hash>:<base64url>
+    if string.match(importString, "^%s*ABISD1:") then
+        local baseHash, newHash, deltaPayload = string.match(importString, "^%s*ABISD1:(%x+):(%x+):([%w%-_]+)%s*$")
+        if baseHash then
+            self:ImportDelta(baseHash, newHash, deltaPayload)
+        else
+            print("|cFFFF0000Invalid import string: malformed update|r")
+        end
+        return
+    end
+
+    -- Content hash appended by the API server (";;HASH##<hash>" or "ABIS1:...:<hash>"),
+    -- which delta updates refer to
+    local importHash = string.match(importString, ";;HASH##(%x+)") or string.match(importString, "^%s*ABIS1:[%w%-_]+:(%x+)")
+
+    -- Compact format: ABIS1:<base64url>
+    local compactPayload = string.match(importString, "^%s*ABIS1:([%w%-_]+)")
+    if compactPayload then
+        local err
+        items, enchants, err = DecodeCompactImport(compactPayload)
+        if not items then
+            print("|cFFFF0000Invalid import string: " .. err .. "|r")
+            return
+        end
     -- Check if this is the new format: BIS##...;;ENCHANT##...
-    if string.find(importString, "BIS##") or string.find(importString, "ENCHANT##") then
+    elseif string.find(importString, "BIS##") or string.find(importString, "ENCHANT##") then
         -- Split by ;; to separate BIS and ENCHANT sections
         local bisSection, enchantSection = string.match(importString, "(.-);;(.*)")
 
@@ -1595,33 +1879,7 @@ function ABIS:ImportItemIDs(importString)
                 for slotPair in string.gmatch(bisContent, "[^;]+") do
                     local slot, itemID = string.match(slotPair, "'([^']+)':(%d+)")
                     if slot and itemID then
-                        -- Map Wowhead slot names to addon slot names
-                        local slotMap = {
-                            ["Head"] = "Head",
-                            ["Neck"] = "Neck",
-                            ["Shoulders"] = "Shoulders",
-                            ["Cloak"] = "Cloak",
-                            ["Chest"] = "Chest",
-                            ["Wrists"] = "Wrists",
-                            ["Hands"] = "Gloves",
-                            ["Waist"] = "Belt",
-                            ["Legs"] = "Legs",
-                            ["Feet"] = "Boots",
-                            ["Finger 1"] = "Ring1",
-                            ["Finger 2"] = "Ring2",
-                            ["Trinket 1"] = "Trinket1",
-                            ["Trinket 2"] = "Trinket2",
-                            ["Main Hand"] = "MainHand",
-                            ["Off Hand"] = "OffHand",
-                            -- Alternative items - keep original slot name with (Alternative) marker
-                            ["Trinket (Alternative)"] = "Trinket (Alternative)",
-                            ["Finger (Alternative)"] = "Finger (Alternative)",
-                            ["Main Hand (Alternative)"] = "Main Hand (Alternative)",
-                        }
-
-                        local addonSlot = slotMap[slot] or slot
-                        local isAlternative = string.match(slot, "%(Alternative%)") ~= nil
-                        table.insert(items, {slot = addonSlot, itemID = tonumber(itemID), isAlternative = isAlternative})
+                        table.insert(items, MakeImportItem(slot, tonumber(itemID)))
                     end
                 end
             end
@@ -1684,7 +1942,8 @@ function ABIS:ImportItemIDs(importString)
         title = "Andrews BiS & Enchantment UI",
         url = "",
         items = items,
-        enchants = enchants  -- Store enchants data
+        enchants = enchants,  -- Store enchants data
+        importHash = importHash
     }
 
     -- Store in memory
@@ -4,328 +4,2216 @@ Flask API Server for AndrewsBISUI
 Scrapes Wowhead BiS pages and returns item IDs as JSON
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import atexit
+import base64
+import contextlib
+import cProfile
+import contextvars
+import copy
+import email.utils
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import marshal
+import math
+import os
+import pstats
+import queue
+import random
 import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from logging.handlers import QueueHandler, QueueListener
 import requests
-from urllib.parse import unquote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+try:
+    import fcntl  # Cross-worker locks (not available on Windows)
+except ImportError:
+    fcntl = None
+
+try:
+    import brotli  # Optional: brotli-compressed home page
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests
 
-def scrape_wowhead_items(url):
+# Upstream (Wowhead) HTTP client settings - override via environment variables
+UPSTREAM_POOL_SIZE = int(os.environ.get('ABIS_UPSTREAM_POOL_SIZE', '10'))
+UPSTREAM_RETRIES = int(os.environ.get('ABIS_UPSTREAM_RETRIES', '2'))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('ABIS_UPSTREAM_CONNECT_TIMEOUT', '5'))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('ABIS_UPSTREAM_READ_TIMEOUT', '15'))
+UPSTREAM_WORKERS = int(os.environ.get('ABIS_UPSTREAM_WORKERS', '8'))
+
+# Upstream limiter: a token bucket shared by all workers (UPSTREAM_RATE
+# requests/second, bursts of UPSTREAM_BURST; 0 disables it), at most
+# UPSTREAM_MAX_CONCURRENCY requests in flight per worker, and requests that
+# would wait longer than UPSTREAM_MAX_WAIT seconds for their turn are refused.
+# After UPSTREAM_BREAKER_THRESHOLD consecutive failures the circuit breaker
+# opens for a jittered exponential backoff of up to UPSTREAM_BACKOFF_MAX seconds.
+UPSTREAM_RATE = float(os.environ.get('ABIS_UPSTREAM_RATE', '5'))
+UPSTREAM_BURST = float(os.environ.get('ABIS_UPSTREAM_BURST', '10'))
+UPSTREAM_MAX_CONCURRENCY = int(os.environ.get('ABIS_UPSTREAM_MAX_CONCURRENCY', str(UPSTREAM_POOL_SIZE)))
+UPSTREAM_MAX_WAIT = float(os.environ.get('ABIS_UPSTREAM_MAX_WAIT', '2'))
+UPSTREAM_BREAKER_THRESHOLD = int(os.environ.get('ABIS_UPSTREAM_BREAKER_THRESHOLD', '5'))
+UPSTREAM_BACKOFF_BASE = 0.5
+UPSTREAM_BACKOFF_MAX = float(os.environ.get('ABIS_UPSTREAM_BACKOFF_MAX', '60'))
+UPSTREAM_RETRY_AFTER_MAX = 300  # Longest Retry-After we honour (seconds)
+
+# Send Wowhead requests to another host instead (e.g. the local stand-in in
+# benchmarks/fake_wowhead.py). Cache keys and responses keep the wowhead.com URLs.
+UPSTREAM_BASE_URL = os.environ.get('ABIS_UPSTREAM_BASE_URL', '').rstrip('/')
+
+# Stream page bodies and stop reading once the part the parsers need is
+# complete. If less than UPSTREAM_DRAIN_BYTES remain, the rest is read anyway
+# so the keep-alive connection can go back to the pool.
+UPSTREAM_STREAM = os.environ.get('ABIS_UPSTREAM_STREAM', '1') == '1'
+UPSTREAM_CHUNK_SIZE = 64 * 1024
+UPSTREAM_DRAIN_BYTES = int(os.environ.get('ABIS_UPSTREAM_DRAIN_BYTES', str(64 * 1024)))
+
+# In-memory page cache settings - BiS guides change roughly once a week
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('ABIS_PAGE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+PAGE_CACHE_TTL = float(os.environ.get('ABIS_PAGE_CACHE_TTL', str(6 * 60 * 60)))
+
+# Stale-while-revalidate: pages older than PAGE_CACHE_TTL (soft TTL) but
+# younger than PAGE_CACHE_HARD_TTL are served immediately and refreshed in the
+# background. Past the hard TTL a request always waits for Wowhead.
+STALE_WHILE_REVALIDATE = os.environ.get('ABIS_STALE_WHILE_REVALIDATE', '1') == '1'
+PAGE_CACHE_HARD_TTL = float(os.environ.get('ABIS_PAGE_CACHE_HARD_TTL', str(7 * 24 * 60 * 60)))
+
+# On-disk cache shared by all gunicorn workers and kept across restarts.
+# Set ABIS_CACHE_DIR to an empty string to disable it.
+CACHE_DIR = os.environ.get('ABIS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+
+# Version of the parsers' output and of the /scrape-full payload. It is part
+# of the parsed table and result keys, so bump it whenever either changes and
+# tables/results stored by older code are no longer used (2: enchant types)
+PARSER_VERSION = 2
+
+# Background pre-warming of every class/spec guide (0 disables the crawler)
+PREWARM_INTERVAL = float(os.environ.get('ABIS_PREWARM_INTERVAL', '0'))
+PREWARM_CONCURRENCY = int(os.environ.get('ABIS_PREWARM_CONCURRENCY', '4'))
+
+# Client-side caching: Cache-Control max-age (seconds) for scrape responses
+# and for the home page, and the smallest response worth gzipping
+RESPONSE_MAX_AGE = int(os.environ.get('ABIS_RESPONSE_MAX_AGE', '300'))
+HOME_MAX_AGE = int(os.environ.get('ABIS_HOME_MAX_AGE', '3600'))
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain')
+
+# Response fields that differ between otherwise identical scrape responses
+# (how the result was served, not what it is) and are left out of ETags
+VOLATILE_RESPONSE_FIELDS = ('cache', 'stale', 'age', 'coalesced')
+
+# How long (seconds) imports are kept by hash so ?since=<import hash> can be
+# answered with a delta; older bases get the full import string
+IMPORT_HISTORY_TTL = float(os.environ.get('ABIS_IMPORT_HISTORY_TTL', str(90 * 24 * 60 * 60)))
+# Imports kept in memory per worker (in front of the on-disk store)
+RECENT_IMPORTS_MAX = 1000
+# Each worker resets the age of a stored import it uses again at most this
+# often, and deletes imports past IMPORT_HISTORY_TTL at most this often
+IMPORT_TOUCH_INTERVAL = 24 * 60 * 60
+IMPORT_PRUNE_INTERVAL = 60 * 60
+
+# Item/enchant metadata for ?enrich=1 (names, icons, quality, item level).
+# Looked up once per id from the Wowhead tooltip API (or the local stand-in
+# when ABIS_UPSTREAM_BASE_URL is set) and kept in the on-disk store
+METADATA_BASE_URL = os.environ.get('ABIS_METADATA_BASE_URL', UPSTREAM_BASE_URL or 'https://nether.wowhead.com').rstrip('/')
+METADATA_TTL = float(os.environ.get('ABIS_METADATA_TTL', str(30 * 24 * 60 * 60)))
+# Ids the source does not know are asked for again after this long
+METADATA_MISS_TTL = 24 * 60 * 60
+# Metadata entries kept in memory per worker (in front of the on-disk store)
+METADATA_MEMORY_MAX = 20000
+# Ids not seen before are looked up in the background (responses say
+# metadata_complete: false until they are in) on a budget of their own, so
+# they never take tokens from page scrapes: METADATA_RATE requests/second
+# shared by all workers, bursts of METADATA_BURST, and at most
+# METADATA_CONCURRENCY lookups at once per worker
+METADATA_RATE = float(os.environ.get('ABIS_METADATA_RATE', '2'))
+METADATA_BURST = float(os.environ.get('ABIS_METADATA_BURST', '5'))
+METADATA_CONCURRENCY = int(os.environ.get('ABIS_METADATA_CONCURRENCY', '2'))
+
+# Token required (X-Admin-Token header) for ?profile=1 / ?profile=cprofile;
+# profiling is unavailable while it is unset
+ADMIN_TOKEN = os.environ.get('ABIS_ADMIN_TOKEN', '')
+
+# /scrape-batch limits
+BATCH_MAX_ENTRIES = int(os.environ.get('ABIS_BATCH_MAX_ENTRIES', '50'))
+BATCH_CONCURRENCY = int(os.environ.get('ABIS_BATCH_CONCURRENCY', '4'))
+
+# Logging - JSON lines on stderr by default. Records are handed to a
+# background thread through a queue, so request threads never block on I/O.
+LOG_LEVEL = os.environ.get('ABIS_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('ABIS_LOG_FORMAT', 'json')  # 'json' or 'text'
+# Fraction of requests whose DEBUG records are kept when ABIS_LOG_LEVEL=DEBUG
+LOG_DEBUG_SAMPLE = float(os.environ.get('ABIS_LOG_DEBUG_SAMPLE', '0.1'))
+
+# Accepted X-Request-ID values; anything else gets a generated id
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+
+# Correlation id of the request being handled (X-Request-ID or generated) and
+# whether its DEBUG records were sampled
+request_id_var = contextvars.ContextVar('abis_request_id', default='-')
+debug_sampled_var = contextvars.ContextVar('abis_debug_sampled', default=True)
+
+# Attributes every LogRecord has - anything else came in through extra={...}
+LOG_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'request_id'}
+
+class JsonLogFormatter(logging.Formatter):
+    """Format a record as one JSON object per line, including its extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for name, value in record.__dict__.items():
+            if name not in LOG_RECORD_ATTRS:
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the request id and drop DEBUG records of unsampled requests"""
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and not debug_sampled_var.get():
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+class QueueLogHandler(QueueHandler):
     """
-    Scrape item IDs with slots from a Wowhead BiS gear guide URL
+    QueueHandler whose listener thread writes to `target`
 
-    Supports hash anchors to select specific BiS tables:
-    - #bis-items-overall (default)
-    - #bis-items-sanlayn (Death Knight hero talent)
-    - #bis-items-deathbringer (Death Knight hero talent)
-    - #bis-items-raid
-    - #bis-items-mythic-plus
+    The listener is started lazily in each process, as threads do not survive
+    gunicorn's fork.
+    """
 
-    Returns a list of dicts with 'slot' and 'id' keys
-    Example: [{'slot': 'Head', 'id': 237628}, {'slot': 'Trinket (Alternative)', 'id': 242396}, ...]
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve the message and traceback now (the arguments may change once
+        # the caller moves on) but leave the formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        self.queue.put_nowait(record)
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # Records queued by the parent process are not ours to write
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records and stop this process's listener"""
+        with self._listener_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+                self._listener = None
+                self._listener_pid = None
+
+def configure_logging():
+    """Set up the 'abis' logger with the queued JSON (or text) handler"""
+    target = logging.StreamHandler()
+    if LOG_FORMAT == 'text':
+        target.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(message)s'))
+    else:
+        target.setFormatter(JsonLogFormatter())
+
+    handler = QueueLogHandler(target)
+    handler.addFilter(RequestContextFilter())
+    atexit.register(handler.stop)
+
+    log = logging.getLogger('abis')
+    log.setLevel(LOG_LEVEL)
+    log.addHandler(handler)
+    log.propagate = False
+    return log
+
+logger = configure_logging()
+
+UPSTREAM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0',
+}
+
+# One pooled session per worker process (gunicorn forks workers, so we
+# remember which PID created the session and rebuild it after a fork)
+_upstream_session = None
+_upstream_session_pid = None
+_upstream_session_lock = threading.Lock()
+
+def get_upstream_session():
     """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0',
-        }
+    Return this worker's shared requests.Session for Wowhead fetches
 
-        response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
-        response.raise_for_status()
-
-        # Check if we got redirected
-        if response.url != url:
-            pass  # Silently handle redirects
-
-        html = response.text
-
-        # The BiS table is inside a JavaScript WH.markup.printHtml("...") call
-        # Extract the content from inside that JavaScript string
-        markup_match = re.search(r'WH\.markup\.printHtml\("(.+?)"\s*,\s*"guide-body"', html, re.DOTALL)
-        if markup_match:
-            # Extract the BBCode content from the JavaScript string
-            bbcode_content = markup_match.group(1)
-            print(f"Extracted {len(bbcode_content)} chars of BBCode content from JavaScript")
-
-            # The JavaScript string has escaped characters - unescape them
-            bbcode_content = bbcode_content.replace(r'\/', '/')
-            bbcode_content = bbcode_content.replace(r'\"', '"')
-
-            # Extract the correct table based on URL hash
-            # Common hash values:
-            # - #bis-items-overall (default for most classes) -> first table
-            # - #bis-items-sanlayn (Death Knight hero talent) -> first table
-            # - #bis-items-deathbringer (Death Knight hero talent) -> second table
-            # - #bis-items-raid, #bis-items-mythic-plus -> additional tables
-
-            table_index = 0  # Default to first table (usually "Overall")
-
-            if '#bis-items-deathbringer' in url.lower():
-                table_index = 1
-                print("Extracting second table (Deathbringer)")
-            elif '#bis-items-sanlayn' in url.lower():
-                table_index = 0
-                print("Extracting first table (San'layn)")
-            elif '#bis-items-overall' in url.lower():
-                table_index = 0
-                print("Extracting first table (Overall)")
-            elif '#bis-items-raid' in url.lower():
-                table_index = 2
-                print("Extracting third table (Raid)")
-            elif '#bis-items-mythic-plus' in url.lower() or '#bis-items-mythic+' in url.lower():
-                table_index = 3
-                print("Extracting fourth table (Mythic+)")
-            else:
-                print("No hash specified, extracting first table (Overall)")
+    The session keeps TCP+TLS connections alive between scrapes. It does not
+    retry by itself: download_wowhead_page retries through the upstream
+    limiter, so a Retry-After never stalls a worker thread.
+    """
+    global _upstream_session, _upstream_session_pid
+
+    pid = os.getpid()
+    if _upstream_session is not None and _upstream_session_pid == pid:
+        return _upstream_session
+
+    with _upstream_session_lock:
+        if _upstream_session is None or _upstream_session_pid != pid:
+            retries = Retry(total=0, raise_on_status=False, respect_retry_after_header=False)
+            adapter = HTTPAdapter(
+                pool_connections=UPSTREAM_POOL_SIZE,
+                pool_maxsize=UPSTREAM_POOL_SIZE,
+                max_retries=retries,
+            )
+            session = requests.Session()
+            session.headers.update(UPSTREAM_HEADERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _upstream_session = session
+            _upstream_session_pid = pid
+
+    return _upstream_session
+
+# Thread pool for running upstream fetches in parallel (one per worker process,
+# threads do not survive a fork so it is created lazily like the session)
+_upstream_executor = None
+_upstream_executor_pid = None
+
+def get_upstream_executor():
+    """Return this worker's thread pool for concurrent Wowhead fetches"""
+    global _upstream_executor, _upstream_executor_pid
+
+    pid = os.getpid()
+    if _upstream_executor is not None and _upstream_executor_pid == pid:
+        return _upstream_executor
+
+    with _upstream_session_lock:
+        if _upstream_executor is None or _upstream_executor_pid != pid:
+            _upstream_executor = ThreadPoolExecutor(
+                max_workers=UPSTREAM_WORKERS,
+                thread_name_prefix='abis-upstream',
+            )
+            _upstream_executor_pid = pid
+
+    return _upstream_executor
+
+def submit_in_context(executor, fn, *args):
+    """
+    Submit fn to a thread pool, carrying over the caller's request id for
+    logging and its profile. Under ?profile=cprofile fn runs inline instead,
+    so the profiler (which only sees its own thread) covers all of the work.
+    """
+    profile = request_profile_var.get()
+    if profile is not None and profile['inline']:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+# Stage timings of the request being profiled (?profile=...), or None
+request_profile_var = contextvars.ContextVar('abis_request_profile', default=None)
+
+# Latency histogram buckets in seconds (Prometheus "le" bounds)
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between each worker's flushes of its metrics to the shared store;
+# gauges of a worker that stopped flushing drop out after a few intervals
+METRICS_FLUSH_INTERVAL = float(os.environ.get('ABIS_METRICS_FLUSH_INTERVAL', '5'))
+METRICS_GAUGE_TTL = 3 * METRICS_FLUSH_INTERVAL
+
+class Metrics:
+    """
+    Counters, latency histograms and gauges rendered in the Prometheus text format
 
-            # Find all [table]...[/table] sections
-            all_tables = re.findall(r'\[table[^\]]*\](.*?)\[/table\]', bbcode_content, re.DOTALL)
-            print(f"Found {len(all_tables)} tables in BBCode")
-
-            if table_index < len(all_tables):
-                bbcode_content = all_tables[table_index]
-                print(f"Extracted table {table_index + 1}: {len(bbcode_content)} chars")
-            elif len(all_tables) > 0:
-                bbcode_content = all_tables[0]
-                print(f"Requested table {table_index + 1} not found, using first table")
+    With a shared store (see share()) every worker adds what it recorded to
+    the store every METRICS_FLUSH_INTERVAL seconds and render() returns the
+    totals of all workers; without one the values are this process's own.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.store = None
+        self._help = {}
+        self._gauges = {}      # name -> function returning the current value
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def describe(self, name, kind, text):
+        """Register the TYPE and HELP lines of a metric"""
+        self._help[name] = (kind, text)
+
+    def gauge(self, name, read):
+        """Register a gauge whose value read() returns at flush/scrape time"""
+        self._gauges[name] = read
+
+    def share(self, store):
+        """Aggregate the metrics of all worker processes in a PageStore"""
+        self.store = store
+
+    def inc(self, name, amount=1, **labels):
+        """Add amount to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._start_flusher()
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        self._start_flusher()
+
+    def timer(self, name, **labels):
+        """Context manager observing the duration of its block"""
+        return MetricsTimer(self, name, labels)
+
+    def samples(self, reset=False):
+        """
+        Return (name, suffix, labels, value) for every counter and histogram
+        series; reset=True hands the values over and starts again from zero
+        """
+        with self._lock:
+            counters, histograms = self._counters, self._histograms
+            if reset:
+                self._counters, self._histograms = {}, {}
+            else:
+                counters = dict(counters)
+                histograms = {key: (list(h[0]), h[1], h[2]) for key, h in histograms.items()}
+
+        samples = [(name, '', labels, value) for (name, labels), value in counters.items()]
+        for (name, labels), (counts, total, count) in histograms.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append((name, '_bucket', labels + (('le', str(bound)),), bucket_count))
+            samples.append((name, '_bucket', labels + (('le', '+Inf'),), count))
+            samples.append((name, '_sum', labels, total))
+            samples.append((name, '_count', labels, count))
+        return samples
+
+    def gauge_values(self):
+        """Return (name, value) of every registered gauge"""
+        return [(name, read()) for name, read in self._gauges.items()]
+
+    def flush(self):
+        """Add what this worker recorded since the last flush to the shared store"""
+        if self.store is not None:
+            self.store.add_metrics(self.samples(reset=True), self.gauge_values())
+
+    def _start_flusher(self):
+        # One flush thread per worker process (gunicorn forks the workers)
+        if self.store is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._run_flusher, name='abis-metrics', daemon=True).start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Metrics flush failed')
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        if self.store is not None:
+            self.flush()
+            samples, gauges = self.store.get_metrics(time.time() - METRICS_GAUGE_TTL)
         else:
-            print("Could not find WH.markup.printHtml content")
-            bbcode_content = html  # Fallback to raw HTML
-
-        # Pattern matches: [td]SlotName[/td][td]...[item=12345 bonus=...]...[/td]
-        # Need to handle optional [b] bold tags around slot names, [color=...] tags, and any other content before [item=
-        # Slot names can include: letters, spaces, digits (for "Ring 1", "Trinket 2"), parentheses (for "Trinket (alt)")
-        # Note: We don't match [tr] prefix because rows may or may not include it
-        table_row_pattern = r'\[td\](?:\[b\])?([ A-Za-z\d\s()]+?)(?:\[/b\])?\[/td\]\[td\].*?\[item=(\d+)'
-
-        matches = re.findall(table_row_pattern, bbcode_content, re.DOTALL)
-
-        print(f"Found {len(matches)} item rows in BiS table")
-        if matches:
-            print(f"First 3 matches: {matches[:3]}")
-
-        items_with_slots = []
-
-        # Map Wowhead slot names to our slot names
-        slot_name_map = {
-            'Head': 'Head',
-            'Neck': 'Neck',
-            'Shoulders': 'Shoulders',
-            'Cloak': 'Cloak',
-            'Chest': 'Chest',
-            'Wrist': 'Wrists',
-            'Wrists': 'Wrists',
-            'Gloves': 'Hands',
-            'Hands': 'Hands',
-            'Belt': 'Waist',
-            'Waist': 'Waist',
-            'Legs': 'Legs',
-            'Boots': 'Feet',
-            'Feet': 'Feet',
-            'Ring': 'Finger 1',  # First ring found
-            'Ring 1': 'Finger 1',
-            'Ring 2': 'Finger 2',
-            'Trinket': 'Trinket 1',  # First trinket found
-            'Trinket 1': 'Trinket 1',
-            'Trinket 2': 'Trinket 2',
-            'Weapon': 'Main Hand',
-            'Main Hand': 'Main Hand',
-            'Off Hand': 'Off Hand',
-            'Offhand': 'Off Hand',
+            samples, gauges = self.samples(), self.gauge_values()
+
+        lines = []
+        described = set()
+
+        def header(name):
+            if name not in described and name in self._help:
+                kind, text = self._help[name]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+                described.add(name)
+
+        for name, value in sorted(gauges):
+            header(name)
+            lines.append(f'{name} {value}')
+
+        for name, suffix, labels, value in sorted(samples, key=metric_sample_order):
+            header(name)
+            lines.append(f'{name}{suffix}{format_metric_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+class MetricsTimer:
+    """Times a block of code into a Metrics histogram"""
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, elapsed, **self.labels)
+        profile = request_profile_var.get()
+        if profile is not None:
+            profile['stages'].append((self.labels.get('stage', self.name), elapsed))
+        return False
+
+def metric_sample_order(sample):
+    """Sort key keeping each histogram's buckets (in "le" order), sum and count together"""
+    name, suffix, labels, _ = sample
+    series = tuple((label, str(value)) for label, value in labels if label != 'le')
+    bound = next((float(value) for label, value in labels if label == 'le'), 0.0)
+    return name, series, ('', '_bucket', '_sum', '_count').index(suffix), bound
+
+def format_metric_labels(labels):
+    """Format (name, value) pairs as a Prometheus label set"""
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+metrics = Metrics()
+metrics.describe('abis_http_requests_total', 'counter', 'HTTP requests handled, by route, method and status')
+metrics.describe('abis_http_request_duration_seconds', 'histogram', 'Time to produce a response, by route')
+metrics.describe('abis_stage_duration_seconds', 'histogram', 'Time spent per scrape stage (fetch, extract, table_parse, enchant_parse, import_build)')
+metrics.describe('abis_upstream_responses_total', 'counter', 'Wowhead responses by HTTP status (error = no response)')
+metrics.describe('abis_upstream_bytes_total', 'counter', 'Bytes read from Wowhead')
+metrics.describe('abis_upstream_refused_total', 'counter', 'Wowhead requests refused by the upstream limiter, by reason')
+metrics.describe('abis_upstream_retries_total', 'counter', 'Wowhead requests retried after a 5xx or connection error')
+metrics.describe('abis_cache_lookups_total', 'counter', 'Page, parsed table and precomputed result lookups by outcome')
+metrics.describe('abis_page_cache_bytes', 'gauge', 'Size of the page bodies held in the in-memory caches of all workers')
+metrics.describe('abis_page_cache_entries', 'gauge', 'Pages held in the in-memory caches of all workers')
+
+class PageCache:
+    """
+    Bounded in-memory cache of fetched pages
+
+    Entries expire `ttl` seconds after they were last validated upstream
+    (callers decide what counts as stale below that) and the least recently used pages are
+    evicted once the total size of cached bodies exceeds `max_bytes`.
+
+    Each entry also holds the parsed form(s) of its body, so a page is parsed
+    once no matter how many anchors/tables are requested from it.
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (body, size, stored_at, parsed)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (body, age in seconds) for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            body, size, validated_at, _ = entry
+            age = max(0.0, time.time() - validated_at)
+            if age > self.ttl:
+                del self._entries[key]
+                self.total_bytes -= size
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body, age
+
+    def put(self, key, body, validated_at=None):
+        """
+        Store body under key, evicting least recently used pages as needed
+        validated_at is when upstream last confirmed the body (default: now)
+        """
+        size = len(body)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+            self._entries[key] = (body, size, validated_at or time.time(), {})
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size, _, _) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def get_parsed(self, key, name, body):
+        """Return the parsed result `name` stored for this exact body, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not body:
+                return None
+            return entry[3].get(name)
+
+    def put_parsed(self, key, name, body, parsed):
+        """Attach a parsed result to the entry, unless the body was replaced meanwhile"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is body:
+                entry[3][name] = parsed
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+page_cache = PageCache(
+    PAGE_CACHE_MAX_BYTES,
+    PAGE_CACHE_HARD_TTL if STALE_WHILE_REVALIDATE else PAGE_CACHE_TTL,
+)
+metrics.gauge('abis_page_cache_bytes', lambda: page_cache.total_bytes)
+metrics.gauge('abis_page_cache_entries', lambda: len(page_cache))
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single execution
+
+    The first caller for a key runs the function; callers arriving while it is
+    still in flight wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        """Run fn(*args) once per in-flight key, returns (result, shared)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+        return future.result(), False
+
+# Identical upstream page downloads and identical /scrape-full requests
+page_flight = SingleFlight()
+scrape_flight = SingleFlight()
+
+class PageStore:
+    """
+    SQLite-backed page store shared by all worker processes
+
+    Keeps the (compressed) body of every fetched page together with its
+    ETag/Last-Modified validators, parsed results keyed by body hash,
+    precomputed /scrape-full results, recent imports by import hash and
+    item/enchant metadata.
+    Storage errors are reported and otherwise ignored - the store is only
+    ever an optimization.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, 'abis_cache.sqlite3')
+        self.lock_dir = os.path.join(cache_dir, 'locks')
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._local = threading.local()
+
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('''CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                body_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                checked_at REAL NOT NULL
+            )''')
+            db.execute('''CREATE TABLE IF NOT EXISTS parsed (
+                url TEXT NOT NULL,
+                name TEXT NOT NULL,
+                body_hash TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (url, name)
+            )''')
+            db.execute('''CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                computed_at REAL NOT NULL
+            )''')
+            db.execute('''CREATE TABLE IF NOT EXISTS imports (
+                hash TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )''')
+            db.execute('CREATE INDEX IF NOT EXISTS imports_stored_at ON imports (stored_at)')
+            db.execute('''CREATE TABLE IF NOT EXISTS metadata (
+                kind TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                data TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (kind, id)
+            )''')
+            db.execute('''CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )''')
+            db.execute('''CREATE TABLE IF NOT EXISTS metrics (
+                name TEXT NOT NULL,
+                suffix TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                value NUMERIC NOT NULL,
+                PRIMARY KEY (name, suffix, labels)
+            )''')
+            db.execute('''CREATE TABLE IF NOT EXISTS metric_gauges (
+                name TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                value NUMERIC NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (name, pid)
+            )''')
+
+            # Parsed tables and results of another parser version are never
+            # read again (their keys differ), so drop them once
+            row = db.execute("SELECT value FROM meta WHERE name = 'parser_version'").fetchone()
+            if row is None or row[0] != str(PARSER_VERSION):
+                db.execute('DELETE FROM parsed')
+                db.execute('DELETE FROM results')
+                db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('parser_version', ?)", (str(PARSER_VERSION),))
+
+    def _connect(self):
+        # One connection per thread (and per process - connections must not
+        # be shared across a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_page(self, url):
+        """Return {'body', 'body_hash', 'etag', 'last_modified', 'checked_at'} or None"""
+        try:
+            row = self._connect().execute(
+                'SELECT body, body_hash, etag, last_modified, checked_at FROM pages WHERE url = ?',
+                (url,),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+            return None
+
+        if row is None:
+            return None
+        return {
+            'body': zlib.decompress(row[0]),
+            'body_hash': row[1],
+            'etag': row[2],
+            'last_modified': row[3],
+            'checked_at': row[4],
         }
 
-        ring_count = 0
-        trinket_count = 0
-
-        for slot_name, item_id in matches:
-            slot_name = slot_name.strip()
-
-            # Track if this is an alternative item
-            is_alternative = False
-            base_slot_name = slot_name
-
-            # Handle alternative/backup slots (e.g., "Trinket (alt)", "Alternative")
-            if '(alt)' in slot_name.lower():
-                is_alternative = True
-                # Extract the base slot name (e.g., "Trinket" from "Trinket (alt)")
-                base_slot_name = re.sub(r'\s*\(alt\)', '', slot_name, flags=re.IGNORECASE).strip()
-            elif slot_name.lower() == 'alternative':
-                # This is typically for weapons - use the previous weapon slot
-                is_alternative = True
-                base_slot_name = 'Weapon'
-
-            # Handle multiple rings/trinkets
-            if base_slot_name == 'Ring':
-                if is_alternative:
-                    mapped_slot = 'Finger (Alternative)'
-                else:
-                    ring_count += 1
-                    mapped_slot = f'Finger {ring_count}'
-            elif base_slot_name == 'Trinket':
-                if is_alternative:
-                    mapped_slot = 'Trinket (Alternative)'
-                else:
-                    trinket_count += 1
-                    mapped_slot = f'Trinket {trinket_count}'
-            elif base_slot_name == 'Weapon':
-                if is_alternative:
-                    mapped_slot = 'Main Hand (Alternative)'
-                else:
-                    mapped_slot = slot_name_map.get(base_slot_name, base_slot_name)
-            else:
-                mapped_slot = slot_name_map.get(base_slot_name, base_slot_name)
-                if is_alternative:
-                    mapped_slot = f'{mapped_slot} (Alternative)'
-
-            # Add all items, including alternatives
-            items_with_slots.append({
-                'slot': mapped_slot,
-                'id': int(item_id)
-            })
-            print(f"Added: {mapped_slot} -> {item_id}")
+    def put_page(self, url, body, etag, last_modified):
+        """Store a freshly downloaded page"""
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO pages (url, body, body_hash, etag, last_modified, checked_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (url, zlib.compress(body), hashlib.sha1(body).hexdigest(), etag, last_modified, time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def touch_page(self, url):
+        """Mark a stored page as revalidated (upstream answered 304)"""
+        try:
+            with self._connect() as db:
+                db.execute('UPDATE pages SET checked_at = ? WHERE url = ?', (time.time(), url))
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def get_parsed(self, url, name, body_hash):
+        try:
+            row = self._connect().execute(
+                'SELECT data FROM parsed WHERE url = ? AND name = ? AND body_hash = ?',
+                (url, name, body_hash),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put_parsed(self, url, name, body_hash, parsed):
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO parsed (url, name, body_hash, data) VALUES (?, ?, ?, ?)',
+                    (url, name, body_hash, json.dumps(parsed)),
+                )
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def get_result(self, key):
+        """Return (payload, computed_at) of a stored /scrape-full result, or None"""
+        try:
+            row = self._connect().execute(
+                'SELECT payload, computed_at FROM results WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+            return None
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put_result(self, key, payload):
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO results (key, payload, computed_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(payload), time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def get_import(self, digest):
+        """Return the (gear items, enchants) of a stored import hash, or None"""
+        try:
+            row = self._connect().execute(
+                'SELECT data FROM imports WHERE hash = ? AND stored_at >= ?',
+                (digest, time.time() - IMPORT_HISTORY_TTL),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+            return None
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        return data['gear_items'], data['enchants']
+
+    def put_import(self, digest, gear_items, enchants_with_slots):
+        """Keep an import by hash (or reset the age of a stored one)"""
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO imports (hash, data, stored_at) VALUES (?, ?, ?)',
+                    (digest, json.dumps({'gear_items': gear_items, 'enchants': enchants_with_slots}), time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def touch_import(self, digest):
+        """Reset the age of a stored import that was used again"""
+        try:
+            with self._connect() as db:
+                db.execute('UPDATE imports SET stored_at = ? WHERE hash = ?', (time.time(), digest))
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def prune_imports(self, before):
+        """Delete the imports last stored or used before `before`"""
+        try:
+            with self._connect() as db:
+                db.execute('DELETE FROM imports WHERE stored_at < ?', (before,))
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def get_metadata(self, kind, ids):
+        """Return {id: (metadata or None, fetched_at)} for the stored ids of one kind"""
+        found = {}
+        ids = list(ids)
+        try:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._connect().execute(
+                    'SELECT id, data, fetched_at FROM metadata WHERE kind = ? AND id IN (%s)' % ','.join('?' * len(chunk)),
+                    (kind, *chunk),
+                ).fetchall()
+                for item_id, data, fetched_at in rows:
+                    found[item_id] = (json.loads(data) if data is not None else None, fetched_at)
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+        return found
+
+    def put_metadata(self, kind, entries, fetched_at):
+        """Store {id: metadata or None (unknown id)} for one kind"""
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO metadata (kind, id, data, fetched_at) VALUES (?, ?, ?, ?)',
+                    [
+                        (kind, item_id, json.dumps(data) if data is not None else None, fetched_at)
+                        for item_id, data in entries.items()
+                    ],
+                )
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def add_metrics(self, samples, gauges):
+        """
+        Add a worker's counter and histogram samples to the totals and record
+        its current gauge values, dropping gauges of workers gone quiet
+        """
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    'INSERT INTO metrics (name, suffix, labels, value) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (name, suffix, labels) DO UPDATE SET value = value + excluded.value',
+                    [
+                        (name, suffix, json.dumps([[label, str(value)] for label, value in labels]), value)
+                        for name, suffix, labels, value in samples
+                    ],
+                )
+                db.executemany(
+                    'INSERT OR REPLACE INTO metric_gauges (name, pid, value, updated_at) VALUES (?, ?, ?, ?)',
+                    [(name, os.getpid(), value, now) for name, value in gauges],
+                )
+                db.execute('DELETE FROM metric_gauges WHERE updated_at < ?', (now - METRICS_GAUGE_TTL,))
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def get_metrics(self, gauges_since):
+        """
+        Return (samples, gauges) summed over all workers, counting only gauges
+        updated at or after gauges_since
+        """
+        try:
+            db = self._connect()
+            rows = db.execute('SELECT name, suffix, labels, value FROM metrics').fetchall()
+            gauges = db.execute(
+                'SELECT name, SUM(value) FROM metric_gauges WHERE updated_at >= ? GROUP BY name',
+                (gauges_since,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+            return [], []
+        samples = [
+            (name, suffix, tuple(tuple(label) for label in json.loads(labels)), value)
+            for name, suffix, labels, value in rows
+        ]
+        return samples, gauges
+
+    def get_meta(self, name):
+        try:
+            row = self._connect().execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Page store read failed', extra={'error': str(e)})
+            return None
+        return row[0] if row else None
+
+    def set_meta(self, name, value):
+        try:
+            with self._connect() as db:
+                db.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+
+    def update_meta(self, name, update):
+        """
+        Atomically replace a meta value across workers: update(old value or
+        None) returns (new value, result). Returns the result, or raises
+        sqlite3.Error (logged) when the store is unusable.
+        """
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                row = db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+                value, result = update(row[0] if row else None)
+                db.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+            except BaseException:
+                db.rollback()
+                raise
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning('Page store write failed', extra={'error': str(e)})
+            raise
+        return result
+
+    def lock(self, key, blocking=True):
+        """
+        Exclusive lock on key across worker processes (a no-op where flock
+        is unavailable). Use as a context manager; with blocking=False check
+        the `acquired` attribute to see whether the lock was obtained.
+        """
+        path = os.path.join(self.lock_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lock')
+        return _FileLock(path, blocking)
+
+class _FileLock:
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.acquired = False
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            self.acquired = True
+            return self
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.acquired = True
+        except BlockingIOError:
+            os.close(self._fd)
+            self._fd = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+def open_page_store():
+    """Open the shared on-disk page store, or None if it is disabled/unusable"""
+    if not CACHE_DIR:
+        return None
+    try:
+        return PageStore(CACHE_DIR)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning('On-disk page cache disabled', extra={'error': str(e)})
+        return None
+
+page_store = open_page_store()
+if page_store is not None:
+    metrics.share(page_store)
+    atexit.register(metrics.flush)
+
+class UpstreamError(Exception):
+    """
+    Wowhead could not be asked or refused to answer; `status` is the HTTP
+    status to report (429 or 503) and `retry_after` the seconds until asking
+    again makes sense
+    """
+    status = 503
+
+    def __init__(self, message, retry_after=None, retryable=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+class UpstreamThrottled(UpstreamError):
+    """Wowhead (or our own rate limit) asked us to slow down"""
+    status = 429
+
+class UpstreamUnavailable(UpstreamError):
+    """Wowhead failed (5xx, connection error, timeout) or the circuit breaker is open"""
+    status = 503
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), UPSTREAM_RETRY_AFTER_MAX)
+
+def backoff_delay(attempt):
+    """Jittered exponential backoff: between half and all of base * 2^attempt, capped"""
+    return min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def check_upstream_status(status, headers):
+    """Raise UpstreamThrottled for a 429 and a retryable UpstreamUnavailable for a 5xx"""
+    if status == 429:
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        raise UpstreamThrottled('Wowhead is rate limiting requests', retry_after=retry_after)
+    if status >= 500:
+        raise UpstreamUnavailable(f'Wowhead returned HTTP {status}', retryable=True)
+
+class UpstreamLimiter:
+    """
+    Token bucket, Retry-After hold-off and circuit breaker for Wowhead requests
+
+    The state lives in the shared store's meta table, so all workers draw on
+    one request budget and all of them hold off after a 429 or while the
+    breaker is open; without the store it is kept per worker.
+    reserve()/record() are the building blocks (also used by the async
+    server), request() wraps them around one blocking request. Each state
+    name is a separate budget (metadata lookups have their own).
+    """
+
+    def __init__(self, store, state_name='upstream_limiter', rate=UPSTREAM_RATE,
+                 burst=UPSTREAM_BURST, max_concurrency=UPSTREAM_MAX_CONCURRENCY):
+        self.store = store
+        self.state_name = state_name
+        self.rate = rate
+        self.burst = burst
+        self._state = None  # used when there is no (working) store
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def _update(self, update):
+        """Apply update(state dict) -> result to the shared state atomically"""
+        def update_json(value):
+            state = json.loads(value) if value else {}
+            result = update(state)
+            return json.dumps(state), result
+
+        if self.store is not None:
+            try:
+                return self.store.update_meta(self.state_name, update_json)
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            if self._state is None:
+                self._state = {}
+            return update(self._state)
+
+    def reserve(self):
+        """
+        Take a request token. Returns the seconds to wait before sending, or
+        raises UpstreamThrottled/UpstreamUnavailable when the request should
+        not be sent at all.
+        """
+        def take(state):
+            now = time.time()
+            blocked_until = state.get('blocked_until', 0.0)
+            if now < blocked_until:
+                return state.get('reason', 'unavailable'), blocked_until - now
+
+            if state.get('failures', 0) >= UPSTREAM_BREAKER_THRESHOLD:
+                # Half-open: this request probes Wowhead, the others keep
+                # failing fast until it is recorded
+                state['blocked_until'] = now + UPSTREAM_CONNECT_TIMEOUT + UPSTREAM_READ_TIMEOUT
+                state['reason'] = 'unavailable'
+                return 'ok', 0.0
+
+            if self.rate <= 0:
+                return 'ok', 0.0
+            tokens = min(self.burst, state.get('tokens', self.burst)
+                         + (now - state.get('updated_at', now)) * self.rate)
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if wait > UPSTREAM_MAX_WAIT:
+                state.update(tokens=tokens, updated_at=now)
+                return 'busy', wait
+            # Tokens may go negative: later requests queue behind this one
+            state.update(tokens=tokens - 1, updated_at=now)
+            return 'ok', wait
+
+        outcome, seconds = self._update(take)
+        if outcome == 'ok':
+            return seconds
+
+        metrics.inc('abis_upstream_refused_total', reason=outcome)
+        retry_after = max(1, round(seconds))
+        if outcome == 'unavailable':
+            raise UpstreamUnavailable('Wowhead is currently unavailable', retry_after=retry_after)
+        if outcome == 'throttled':
+            raise UpstreamThrottled('Wowhead is rate limiting requests', retry_after=retry_after)
+        raise UpstreamThrottled('Too many requests to Wowhead right now', retry_after=retry_after)
+
+    def record(self, error=None):
+        """Record the outcome of a request: None for any answer that is not a 429/5xx"""
+        def update(state):
+            now = time.time()
+            if error is None:
+                # An answer closes the breaker; a Retry-After hold-off stands
+                state['failures'] = 0
+                if state.get('reason') == 'unavailable':
+                    state.update(blocked_until=0.0, reason=None)
+                return
+
+            failures = state.get('failures', 0) + 1
+            state['failures'] = failures
+            if isinstance(error, UpstreamThrottled):
+                # Everyone holds off for the Retry-After (or our own backoff)
+                delay = error.retry_after if error.retry_after is not None else backoff_delay(failures - 1)
+                state.update(blocked_until=max(state.get('blocked_until', 0.0), now + delay),
+                             reason='throttled', tokens=0.0, updated_at=now)
+            elif failures >= UPSTREAM_BREAKER_THRESHOLD:
+                delay = backoff_delay(failures - UPSTREAM_BREAKER_THRESHOLD)
+                state.update(blocked_until=now + delay, reason='unavailable')
+                logger.warning('Upstream circuit breaker open', extra={'failures': failures, 'seconds': round(delay, 1)})
+
+        self._update(update)
+
+    @contextlib.contextmanager
+    def request(self):
+        """
+        Context manager around one blocking upstream request: waits for a
+        token and a concurrency slot (or raises UpstreamError) and records
+        the outcome from the exception the block raises, if any
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        if not self._slots.acquire(timeout=UPSTREAM_MAX_WAIT):
+            metrics.inc('abis_upstream_refused_total', reason='busy')
+            raise UpstreamThrottled('Too many requests to Wowhead right now', retry_after=1)
+        try:
+            yield
+        except (UpstreamThrottled, UpstreamUnavailable) as e:
+            self.record(e)
+            raise
+        except Exception:
+            self.record()  # e.g. a 404 - Wowhead itself is fine
+            raise
+        else:
+            self.record()
+        finally:
+            self._slots.release()
+
+upstream_limiter = UpstreamLimiter(page_store)
+metadata_limiter = UpstreamLimiter(page_store, 'metadata_limiter', METADATA_RATE, METADATA_BURST, METADATA_CONCURRENCY)
+
+def upstream_url(url):
+    """Return the URL to request for a Wowhead page, honouring ABIS_UPSTREAM_BASE_URL"""
+    if not UPSTREAM_BASE_URL:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(UPSTREAM_BASE_URL)
+    return urlunsplit((base.scheme, base.netloc, base.path + parts.path, parts.query, ''))
+
+def normalize_url(url):
+    """
+    Normalize a Wowhead URL for use as a cache key
 
-        return items_with_slots
+    The #fragment is never sent to the server, so
+    .../bis-gear#bis-items-sanlayn and .../bis-gear#bis-items-deathbringer
+    are the same page.
+    """
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
 
+def fetch_wowhead_page(url, fetch_info=None):
+    """
+    Fetch a Wowhead page through the page cache and shared upstream session
+    Returns the raw page bytes, raises requests exceptions on failure
+
+    If a fetch_info dict is passed, 'cache' is set to one of:
+    - 'hit'         - served from this worker's memory cache
+    - 'disk'        - served from the shared on-disk cache
+    - 'revalidated' - upstream confirmed the stored copy is current (304)
+    - 'miss'        - downloaded from Wowhead
+    - 'coalesced'   - waited on an identical download already in flight
+    and 'stale'/'age' tell whether the copy is past the soft TTL (and being
+    refreshed in the background) and how many seconds ago it was validated.
+    """
+    key = normalize_url(url)
+
+    cached = page_cache.get(key)
+    if cached is not None:
+        body, age = cached
+        if age < PAGE_CACHE_TTL or STALE_WHILE_REVALIDATE:
+            stale = age >= PAGE_CACHE_TTL
+            if stale:
+                refresh_page_in_background(key)
+            if fetch_info is not None:
+                fetch_info.update(cache='hit', stale=stale, age=int(age))
+            metrics.inc('abis_cache_lookups_total', cache='page', result='hit')
+            return body
+
+    (body, status, age), shared = page_flight.do(key, load_wowhead_page, key)
+    metrics.inc('abis_cache_lookups_total', cache='page', result='coalesced' if shared else status)
+
+    if fetch_info is not None:
+        fetch_info.update(
+            cache='coalesced' if shared else status,
+            stale=age >= PAGE_CACHE_TTL,
+            age=int(age),
+        )
+    return body
+
+def load_wowhead_page(key):
+    """
+    Load a page that is not fresh in this worker's memory cache
+    Returns (body bytes, cache status, age in seconds)
+    """
+    if page_store is None:
+        return download_wowhead_page(key, None), 'miss', 0.0
+
+    # Only one worker at a time fetches a given page; the others wait here
+    # and then find it in the shared store
+    with page_store.lock(key):
+        # Another request may have finished loading it while we were queued
+        cached = page_cache.get(key)
+        if cached is not None and cached[1] < PAGE_CACHE_TTL:
+            return cached[0], 'hit', cached[1]
+
+        stored = page_store.get_page(key)
+        if stored is not None:
+            age = max(0.0, time.time() - stored['checked_at'])
+            if age < PAGE_CACHE_TTL or (STALE_WHILE_REVALIDATE and age < PAGE_CACHE_HARD_TTL):
+                page_cache.put(key, stored['body'], stored['checked_at'])
+                if age >= PAGE_CACHE_TTL:
+                    refresh_page_in_background(key)
+                return stored['body'], 'disk', age
+
+        try:
+            body = download_wowhead_page(key, stored)
+        except UpstreamError as e:
+            # Better an old copy than none while Wowhead is throttling or down
+            if stored is None or age >= PAGE_CACHE_HARD_TTL:
+                raise
+            logger.warning('Serving stale page, upstream failed', extra={'url': key, 'error': str(e)})
+            page_cache.put(key, stored['body'], stored['checked_at'])
+            return stored['body'], 'disk', age
+
+    status = 'revalidated' if stored is not None and body is stored['body'] else 'miss'
+    return body, status, 0.0
+
+# Pages with a background refresh queued or running in this worker
+_refreshing_pages = set()
+_refreshing_lock = threading.Lock()
+
+def refresh_page_in_background(key):
+    """Queue a background revalidation of a stale page (once per page)"""
+    with _refreshing_lock:
+        if key in _refreshing_pages:
+            return
+        _refreshing_pages.add(key)
+
+    submit_in_context(get_upstream_executor(), refresh_page, key)
+
+def refresh_page(key):
+    """Revalidate a stale page with Wowhead, updating both caches"""
+    try:
+        if page_store is None:
+            download_wowhead_page(key, None)
+            return
+
+        with page_store.lock(key):
+            stored = page_store.get_page(key)
+            if stored is not None and time.time() - stored['checked_at'] < PAGE_CACHE_TTL:
+                # Another worker already refreshed it
+                page_cache.put(key, stored['body'], stored['checked_at'])
+                return
+            download_wowhead_page(key, stored)
     except Exception as e:
-        return []
+        logger.warning('Background refresh failed', extra={'url': key, 'error': str(e)})
+    finally:
+        with _refreshing_lock:
+            _refreshing_pages.discard(key)
 
-def scrape_wowhead_enchants(url):
+class GuideBodyScanner:
     """
-    Scrape enchant IDs from a Wowhead enchants guide URL
-    Returns list of enchant spell IDs (one per slot)
+    Incremental scanner for BiS guide pages: finds the end of the
+    WH.markup.printHtml("...", "guide-body" call that holds the BBCode
+    """
+    START = re.compile(rb'WH\.markup\.printHtml\("')
+    END = re.compile(rb'"\s*,\s*"guide-body"')
+
+    def __init__(self):
+        self.pos = 0
+        self.start = None
+
+    def feed(self, buffer):
+        """Return the offset where the needed content ends, or None to keep reading"""
+        if self.start is None:
+            match = self.START.search(buffer, self.pos)
+            if not match:
+                self.pos = max(0, len(buffer) - 32)
+                return None
+            self.start = self.pos = match.end()
+
+        match = self.END.search(buffer, self.pos)
+        if match:
+            return match.end()
+
+        self.pos = max(self.start, len(buffer) - 64)
+        return None
+
+class EnchantTablesScanner:
+    """
+    Incremental scanner for enchant guide pages: the enchant tables all sit in
+    the guide body, so reading can stop at the first end-of-guide marker that
+    follows a </table>
+    """
+    END_MARKERS = re.compile(rb'<div[^>]*\bid="comments"|<footer\b', re.IGNORECASE)
+
+    def __init__(self):
+        self.pos = 0
+
+    def feed(self, buffer):
+        """Return the offset where the needed content ends, or None to keep reading"""
+        while True:
+            match = self.END_MARKERS.search(buffer, self.pos)
+            if not match:
+                self.pos = max(self.pos, len(buffer) - 64)
+                return None
+            if buffer.rfind(b'</table>', 0, match.start()) != -1:
+                return match.start()
+            self.pos = match.end()
+
+def page_scanner(key):
+    """Pick the incremental scanner for a page URL"""
+    if 'enchants-gems' in key:
+        return EnchantTablesScanner()
+    return GuideBodyScanner()
+
+def read_page_body(response, scanner):
     """
+    Read a streamed response until the scanner has seen everything the
+    parsers need, then drain or close the connection
+    Returns the (possibly truncated) body as bytes
+    """
+    body = bytearray()
+    end = None
+
+    for chunk in response.iter_content(chunk_size=UPSTREAM_CHUNK_SIZE):
+        body += chunk
+        end = scanner.feed(body)
+        if end is not None:
+            break
+
+    if end is None:
+        return bytes(body)
+
+    # Finish small remainders so the connection is reused, drop big ones
+    content_length = response.headers.get('Content-Length')
+    remaining = int(content_length) - response.raw.tell() if content_length and content_length.isdigit() else None
+    if remaining is not None and remaining <= UPSTREAM_DRAIN_BYTES:
+        for _ in response.iter_content(chunk_size=UPSTREAM_CHUNK_SIZE):
+            pass
+    else:
+        response.close()
+
+    logger.debug('Stopped reading page early', extra={'url': response.url, 'bytes': len(body)})
+    del body[end:]
+    return bytes(body)
+
+def download_wowhead_page(key, stored):
+    """
+    Download a page from Wowhead and store it in the page caches
+
+    The body is streamed and only read up to the end of the content the
+    parsers use (see GuideBodyScanner/EnchantTablesScanner).
+    If a stored copy exists, the request is made conditional on its
+    ETag/Last-Modified, and a 304 answer reuses the stored body.
+
+    Requests go through upstream_limiter. 5xx answers and connection errors
+    are retried with jittered backoff; a 429 is not retried here but makes
+    every worker hold off for its Retry-After. Raises UpstreamError when
+    Wowhead cannot be asked or does not answer, requests exceptions for
+    other failures (such as a 404).
+    """
+    headers = {}
+    if stored is not None:
+        if stored['etag']:
+            headers['If-None-Match'] = stored['etag']
+        if stored['last_modified']:
+            headers['If-Modified-Since'] = stored['last_modified']
+
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        try:
+            with upstream_limiter.request():
+                return request_wowhead_page(key, stored, headers)
+        except UpstreamError as e:
+            if not e.retryable or attempt == UPSTREAM_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            metrics.inc('abis_upstream_retries_total')
+            logger.info('Retrying upstream request', extra={'url': key, 'error': str(e), 'seconds': round(delay, 2)})
+            time.sleep(delay)
+
+def request_wowhead_page(key, stored, headers):
+    """Send one request for a page (see download_wowhead_page)"""
+    session = get_upstream_session()
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0',
-        }
+        with metrics.timer('abis_stage_duration_seconds', stage='fetch'), session.get(
+            upstream_url(key),
+            headers=headers,
+            timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT),
+            allow_redirects=True,
+            stream=UPSTREAM_STREAM,
+        ) as response:
+            metrics.inc('abis_upstream_responses_total', status=response.status_code)
+            if response.status_code == 304 and stored is not None:
+                page_store.touch_page(key)
+                page_cache.put(key, stored['body'])
+                return stored['body']
+
+            check_upstream_status(response.status_code, response.headers)
+            response.raise_for_status()
+
+            # Keep the raw bytes - parsers decode only the slices they use
+            if UPSTREAM_STREAM:
+                body = read_page_body(response, page_scanner(key))
+            else:
+                body = response.content
+            metrics.inc('abis_upstream_bytes_total', upstream_bytes_read(response, body))
+    except (requests.ConnectionError, requests.Timeout) as e:
+        metrics.inc('abis_upstream_responses_total', status='error')
+        raise UpstreamUnavailable('Could not reach Wowhead', retryable=True) from e
+    except requests.RequestException as e:
+        if e.response is None:
+            metrics.inc('abis_upstream_responses_total', status='error')
+        raise
+
+    page_cache.put(key, body)
+    if page_store is not None:
+        page_store.put_page(key, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return body
+
+def upstream_bytes_read(response, body):
+    """Bytes read off the wire for a response (falls back to the body size)"""
+    try:
+        return response.raw.tell() or len(body)
+    except (AttributeError, OSError, ValueError):
+        return len(body)
 
-        response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
-        response.raise_for_status()
+def record_scrape_failure(url, error, fetch_info=None):
+    """
+    Log a scrape that failed for another reason than the upstream (e.g. a
+    404 or a parser error) and mark its fetch_info, so the degraded result
+    is not stored
+    """
+    logger.warning('Scrape failed', extra={'url': url, 'error': f'{type(error).__name__}: {error}'})
+    if fetch_info is not None:
+        fetch_info['error'] = str(error)
+
+def result_storable(payload, status, *fetch_infos):
+    """Whether a /scrape-full result is complete and fresh enough to be stored as precomputed"""
+    return (
+        status == 200
+        and not payload['stale']
+        and not any('error' in info for info in fetch_infos)
+    )
+
+def page_freshness(*fetch_infos):
+    """Combine fetch_info dicts into the 'stale'/'age' fields of a response"""
+    infos = [info for info in fetch_infos if 'cache' in info]
+    return {
+        'stale': any(info.get('stale') for info in infos),
+        'age': max((info.get('age', 0) for info in infos), default=0),
+    }
+
+def get_parsed_page(url, parser, fetch_info=None):
+    """
+    Fetch a page and return parser(body bytes), running the parser only once per
+    page body (results are also shared between workers via the on-disk store).
+    Callers must treat the returned structure as read-only.
+    """
+    key = normalize_url(url)
+    body = fetch_wowhead_page(url, fetch_info)
+    return parse_page_body(key, body, parser)
+
+def parsed_name(parser):
+    """Name of a parser's output in the parsed caches"""
+    return f'{parser.__name__}:v{PARSER_VERSION}'
+
+def parse_page_body(key, body, parser):
+    """Return parser(body) for a fetched page, from the parsed caches when possible"""
+    name = parsed_name(parser)
+    parsed = page_cache.get_parsed(key, name, body)
+    if parsed is not None:
+        metrics.inc('abis_cache_lookups_total', cache='parsed', result='hit')
+        return parsed
+
+    body_hash = None
+    if page_store is not None:
+        body_hash = hashlib.sha1(body).hexdigest()
+        parsed = page_store.get_parsed(key, name, body_hash)
+
+    if parsed is None:
+        metrics.inc('abis_cache_lookups_total', cache='parsed', result='miss')
+        parsed = parser(body)
+        if body_hash is not None:
+            page_store.put_parsed(key, name, body_hash, parsed)
+    else:
+        metrics.inc('abis_cache_lookups_total', cache='parsed', result='disk')
 
-        # Check if we got redirected
-        if response.url != url:
-            pass  # Silently handle redirects
+    page_cache.put_parsed(key, name, body, parsed)
+    return parsed
 
-        html = response.text
+# Markup tokenizer
+# Guide tables are read with a single forward scan over their tags instead of
+# nested backtracking regexes, so the work is linear in the size of the input
+# no matter how malformed or unexpectedly laid out a page is.
+TAG_NAME = re.compile(r'\s*(\\?/)?\s*([A-Za-z][A-Za-z0-9-]*)')
+TAG_NAME_BYTES = re.compile(rb'\s*(\\?/)?\s*([A-Za-z][A-Za-z0-9-]*)')
 
-        # Extract ALL tables (not just the first one)
-        # This handles cases where weapon enchants are in a separate table (e.g., Frost DK)
-        all_tables = re.findall(r'<table[^>]*>(.*?)</table>', html, re.DOTALL | re.IGNORECASE)
+def iter_tags(data, start=0, end=None, html=False):
+    """
+    Yield (name, closing, attrs, tag_start, tag_end) for each BBCode tag
+    (or HTML tag when html=True) in data[start:end]
 
-        if not all_tables:
-            return []
+    data may be str or bytes. Names are lowercased str, attrs is whatever
+    follows the name inside the brackets, e.g. '=12345 bonus=1' for
+    '[item=12345 bonus=1]'. Brackets that don't form a tag are skipped.
+    """
+    if end is None:
+        end = len(data)
+    is_bytes = isinstance(data, bytes)
+    if is_bytes:
+        open_char, close_char = (b'<', b'>') if html else (b'[', b']')
+        tag_name = TAG_NAME_BYTES
+    else:
+        open_char, close_char = ('<', '>') if html else ('[', ']')
+        tag_name = TAG_NAME
+
+    pos = start
+    while pos < end:
+        tag_start = data.find(open_char, pos, end)
+        if tag_start == -1:
+            return
+        tag_end = data.find(close_char, tag_start + 1, end)
+        if tag_end == -1:
+            return
+        # "[[b]" or "a < b <i>": the tag starts at the last opener before the
+        # closer, so no character is ever scanned more than a couple of times
+        inner_start = data.rfind(open_char, tag_start + 1, tag_end)
+        if inner_start != -1:
+            tag_start = inner_start
+        pos = tag_end + 1
+
+        name_match = tag_name.match(data, tag_start + 1, tag_end)
+        if not name_match:
+            continue
+        name = name_match.group(2).lower()
+        if is_bytes:
+            name = name.decode('ascii')
+        yield name, bool(name_match.group(1)), data[name_match.end():tag_end], tag_start, tag_end + 1
+
+def iter_table_spans(data, start=0, end=None, html=False):
+    """Yield (start, end) offsets of the contents of each table in data[start:end]"""
+    table_start = None
+    for name, closing, _, tag_start, tag_end in iter_tags(data, start, end, html):
+        if name != 'table':
+            continue
+        if not closing:
+            if table_start is None:
+                table_start = tag_end
+        elif table_start is not None:
+            yield table_start, tag_start
+            table_start = None
+
+def iter_table_rows(data, start=0, end=None, html=False):
+    """
+    Yield the rows of a table as lists of (start, end) cell content offsets
 
-        # Parse each row to extract slot and enchant ID
-        enchants_with_slots = []
+    [tr] tags are optional: cells outside of any row are returned together
+    as one row. Unclosed cells end where the next cell or row starts.
+    """
+    if end is None:
+        end = len(data)
+    row = []
+    cell_start = None
+    for name, closing, _, tag_start, tag_end in iter_tags(data, start, end, html):
+        if name in ('td', 'th'):
+            if cell_start is not None:
+                row.append((cell_start, tag_start))
+            cell_start = None if closing else tag_end
+        elif name == 'tr':
+            if cell_start is not None:
+                row.append((cell_start, tag_start))
+                cell_start = None
+            if row:
+                yield row
+                row = []
+    if cell_start is not None:
+        row.append((cell_start, end))
+    if row:
+        yield row
+
+def markup_text(data, start=0, end=None, html=False):
+    """Return the text of data[start:end] with all tags removed"""
+    if end is None:
+        end = len(data)
+    parts = []
+    pos = start
+    for _, _, _, tag_start, tag_end in iter_tags(data, start, end, html):
+        parts.append(data[pos:tag_start])
+        pos = tag_end
+    parts.append(data[pos:end])
+    return ''.join(parts)
+
+
+# Map Wowhead slot names to our slot names
+SLOT_NAME_MAP = {
+    'Head': 'Head',
+    'Neck': 'Neck',
+    'Shoulders': 'Shoulders',
+    'Cloak': 'Cloak',
+    'Chest': 'Chest',
+    'Wrist': 'Wrists',
+    'Wrists': 'Wrists',
+    'Gloves': 'Hands',
+    'Hands': 'Hands',
+    'Belt': 'Waist',
+    'Waist': 'Waist',
+    'Legs': 'Legs',
+    'Boots': 'Feet',
+    'Feet': 'Feet',
+    'Ring': 'Finger 1',  # First ring found
+    'Ring 1': 'Finger 1',
+    'Ring 2': 'Finger 2',
+    'Trinket': 'Trinket 1',  # First trinket found
+    'Trinket 1': 'Trinket 1',
+    'Trinket 2': 'Trinket 2',
+    'Weapon': 'Main Hand',
+    'Main Hand': 'Main Hand',
+    'Off Hand': 'Off Hand',
+    'Offhand': 'Off Hand',
+}
+
+# Tab group of the BiS tables on Wowhead gear guides ("#bis-items-<tab>")
+DEFAULT_TAB_GROUP = 'bis-items'
+
+def get_bis_table_index(url):
+    """
+    Pick the BiS table to use based on the URL hash
+    Common hash values:
+    - #bis-items-overall (default for most classes) -> first table
+    - #bis-items-sanlayn (Death Knight hero talent) -> first table
+    - #bis-items-deathbringer (Death Knight hero talent) -> second table
+    - #bis-items-raid, #bis-items-mythic-plus -> additional tables
+    """
+    table_index = 0  # Default to first table (usually "Overall")
+
+    if '#bis-items-deathbringer' in url.lower():
+        table_index = 1
+        logger.debug('Extracting second table (Deathbringer)')
+    elif '#bis-items-sanlayn' in url.lower():
+        table_index = 0
+        logger.debug("Extracting first table (San'layn)")
+    elif '#bis-items-overall' in url.lower():
+        table_index = 0
+        logger.debug('Extracting first table (Overall)')
+    elif '#bis-items-raid' in url.lower():
+        table_index = 2
+        logger.debug('Extracting third table (Raid)')
+    elif '#bis-items-mythic-plus' in url.lower() or '#bis-items-mythic+' in url.lower():
+        table_index = 3
+        logger.debug('Extracting fourth table (Mythic+)')
+    else:
+        logger.debug('No hash specified, extracting first table (Overall)')
+
+    return table_index
+
+SLOT_LABEL = re.compile(r'[ A-Za-z\d\s()]+')
+ITEM_ID = re.compile(r'=(\d+)')
+
+def bbcode_slot_label(text, start, end):
+    """Return the slot name in a [td] cell like "Head" or "[b]Ring 1[/b]", or None"""
+    for name, _, _, _, _ in iter_tags(text, start, end):
+        if name != 'b':
+            return None
+    label = markup_text(text, start, end)
+    return label if SLOT_LABEL.fullmatch(label) else None
+
+def bbcode_item_id(text, start, end):
+    """Return the id of the first [item=...] tag in a [td] cell, or None"""
+    for name, closing, attrs, _, _ in iter_tags(text, start, end):
+        if name == 'item' and not closing:
+            id_match = ITEM_ID.match(attrs)
+            if id_match:
+                return id_match.group(1)
+    return None
 
-        # Define valid enchantable slots (exclude consumables like flasks, potions, food, etc.)
-        valid_enchant_slots = {
-            'Weapon', 'Main Hand', 'Off Hand', 'Cloak', 'Chest', 'Bracers', 'Wrists',
-            'Legs', 'Boots', 'Hands', 'Ring', 'Ring - Regular', 'Ring - Cursed',
-            'Shattering Blade', 'Two-Hand', 'All other builds'  # DK weapon build names
-        }
+def parse_bis_rows(bbcode_content):
+    """
+    Reduce one BBCode table to a list of {'slot', 'id'} dicts
+    """
+    # Rows look like: [td]SlotName[/td][td]...[item=12345 bonus=...]...[/td]
+    # Slot cells may be wrapped in [b] bold tags; the item cell may hold [color=...] or any other tags before [item=
+    # Slot names can include: letters, spaces, digits (for "Ring 1", "Trinket 2"), parentheses (for "Trinket (alt)")
+    # Note: [tr] is optional because rows may or may not include it
+    matches = []
+    for cells in iter_table_rows(bbcode_content):
+        i = 0
+        while i < len(cells) - 1:
+            slot_name = bbcode_slot_label(bbcode_content, *cells[i])
+            item_id = slot_name and bbcode_item_id(bbcode_content, *cells[i + 1])
+            if item_id:
+                matches.append((slot_name, item_id))
+                i += 2
+            else:
+                i += 1
 
-        # Process all tables
-        for table_html in all_tables:
-            # Split table into rows
-            rows = re.findall(r'<tr>(.*?)</tr>', table_html, re.DOTALL | re.IGNORECASE)
+    logger.debug('Found item rows in BiS table', extra={'rows': len(matches), 'first': matches[:3]})
 
-            for i, row in enumerate(rows):
-                # Skip header rows (contains <b>Slot</b>, <b>Build</b>, <b>Runeforge</b>, etc.)
-                if '<b>Slot</b>' in row or '<b>Best' in row or '<b>Build</b>' in row or '<b>Runeforge</b>' in row:
-                    continue
+    items_with_slots = []
 
-                # Extract all <td> cells from the row
-                cells = re.findall(r'<td[^>]*>(.*?)</td>', row, re.DOTALL | re.IGNORECASE)
+    ring_count = 0
+    trinket_count = 0
 
-                if len(cells) < 2:
-                    continue
+    for slot_name, item_id in matches:
+        slot_name = slot_name.strip()
 
-                # First cell is the slot/build name
-                slot_cell = cells[0]
-                slot_name = re.sub(r'<[^>]+>', '', slot_cell).strip()
+        # Track if this is an alternative item
+        is_alternative = False
+        base_slot_name = slot_name
 
-                # Skip empty slot names or non-enchant slots (flasks, potions, food, gems, etc.)
-                if not slot_name or slot_name not in valid_enchant_slots:
-                    continue
+        # Handle alternative/backup slots (e.g., "Trinket (alt)", "Alternative")
+        if '(alt)' in slot_name.lower():
+            is_alternative = True
+            # Extract the base slot name (e.g., "Trinket" from "Trinket (alt)")
+            base_slot_name = re.sub(r'\s*\(alt\)', '', slot_name, flags=re.IGNORECASE).strip()
+        elif slot_name.lower() == 'alternative':
+            # This is typically for weapons - use the previous weapon slot
+            is_alternative = True
+            base_slot_name = 'Weapon'
 
-                # Second cell contains the enchant links
-                enchant_cell = cells[1]
-
-                # Split cell by <br> to get individual enchant options
-                enchant_options = re.split(r'<br\s*/?>', enchant_cell, flags=re.IGNORECASE)
-
-                # Collect ALL enchant options with their context (Hero Talent, ST/AoE, etc.)
-                enchant_list = []
-
-                for option in enchant_options:
-                    # Look for spell ID or item ID
-                    spell_match = re.search(r'spell[=/](\d{5,7})', option)
-                    item_match = re.search(r'item[=/](\d{5,7})', option)
-
-                    enchant_id = None
-                    if spell_match:
-                        enchant_id = int(spell_match.group(1))
-                    elif item_match:
-                        enchant_id = int(item_match.group(1))
-
-                    if not enchant_id:
-                        continue
-
-                    # Extract context from parentheses like "(Deathbringer ST)" or "(San'layn)"
-                    # Pattern: </a> ( ... text ... ) at end of line
-                    context = ""
-                    context_match = re.search(r'</a>\s*\((.*?)\)\s*$', option, re.DOTALL)
-                    if context_match:
-                        raw_context = context_match.group(1)
-                        # Clean up: remove HTML tags, &nbsp;, normalize whitespace
-                        context = re.sub(r'<[^>]+>', '', raw_context)  # Remove HTML tags
-                        context = re.sub(r'&nbsp;', ' ', context)  # Replace &nbsp; with space
-                        context = re.sub(r'\s+', ' ', context).strip()  # Normalize whitespace
-
-                    enchant_list.append({
-                        'id': enchant_id,
-                        'context': context
-                    })
-
-                if not enchant_list:
+        # Handle multiple rings/trinkets
+        if base_slot_name == 'Ring':
+            if is_alternative:
+                mapped_slot = 'Finger (Alternative)'
+            else:
+                ring_count += 1
+                mapped_slot = f'Finger {ring_count}'
+        elif base_slot_name == 'Trinket':
+            if is_alternative:
+                mapped_slot = 'Trinket (Alternative)'
+            else:
+                trinket_count += 1
+                mapped_slot = f'Trinket {trinket_count}'
+        elif base_slot_name == 'Weapon':
+            if is_alternative:
+                mapped_slot = 'Main Hand (Alternative)'
+            else:
+                mapped_slot = SLOT_NAME_MAP.get(base_slot_name, base_slot_name)
+        else:
+            mapped_slot = SLOT_NAME_MAP.get(base_slot_name, base_slot_name)
+            if is_alternative:
+                mapped_slot = f'{mapped_slot} (Alternative)'
+
+        # Add all items, including alternatives
+        items_with_slots.append({
+            'slot': mapped_slot,
+            'id': int(item_id)
+        })
+        logger.debug('Added: %s -> %s', mapped_slot, item_id)
+
+    return items_with_slots
+
+# Byte patterns for locating the BBCode guide body in a page without decoding
+# or copying the whole page
+GUIDE_BODY_START = re.compile(rb'WH\.markup\.printHtml\("')
+GUIDE_BODY_END = re.compile(rb'"\s*,\s*"guide-body"')
+def unescape_js_string(data):
+    """Decode and unescape a slice of the printHtml JavaScript string"""
+    text = data.decode('utf-8', errors='replace')
+    text = text.replace(r'\/', '/')
+    return text.replace(r'\"', '"')
+
+def find_guide_body(body):
+    """Return the (start, end) offsets of the BBCode guide body in a page, or None"""
+    start_match = GUIDE_BODY_START.search(body)
+    if not start_match:
+        return None
+    end_match = GUIDE_BODY_END.search(body, start_match.end() + 1)
+    if not end_match:
+        return None
+    return start_match.end(), end_match.start()
+
+TAG_NAME_ATTR = re.compile(r'\bname\s*=\s*(?:"([^"]*)"|([^\s"]+))')
+BBCODE_HEADINGS = ('h2', 'h3', 'h4')
+
+def tag_name_attr(attrs):
+    """Return the name="..." attribute of a raw BBCode tag, or None"""
+    name_match = TAG_NAME_ATTR.search(unescape_js_string(attrs))
+    if not name_match:
+        return None
+    return (name_match.group(1) or name_match.group(2)).strip() or None
+
+def slugify(text):
+    """Turn a tab name or URL fragment into an anchor slug, e.g. "Mythic+" -> "mythic-plus" """
+    if not text:
+        return None
+    text = text.lower().replace("'", '').replace('+', ' plus')
+    return re.sub(r'[^a-z0-9]+', '-', text).strip('-') or None
+
+def find_bbcode_tables(body, start, end):
+    """
+    Yield (start, end, label, anchor) for each [table] in body[start:end]
+
+    label is the name of the [tab] or the text of the [h2]/[h3]/[h4] heading
+    that introduces the table, anchor the fragment Wowhead links it with
+    (e.g. 'bis-items-sanlayn'). Both are None for tables without either.
+    """
+    # "[/table]" is escaped as "[\/table]" in the JS string, which iter_tags accepts
+    tabs_name = None
+    label = anchor = None
+    from_tab = False
+    heading = None  # (tag name, text offset) of the heading being read
+    table_start = None
+    for name, closing, attrs, tag_start, tag_end in iter_tags(body, start, end):
+        if table_start is not None:
+            if name == 'table' and closing:
+                yield table_start, tag_start, label, anchor
+                table_start = None
+                label = anchor = None
+                from_tab = False
+            continue
+
+        if name == 'table' and not closing:
+            table_start = tag_end
+        elif name == 'tabs':
+            tabs_name = None if closing else tag_name_attr(attrs)
+        elif name == 'tab' and not closing:
+            label = tag_name_attr(attrs)
+            anchor = slugify(f'{tabs_name}-{label}' if tabs_name and label else label)
+            from_tab = True
+        elif name in BBCODE_HEADINGS:
+            if not closing:
+                heading = (name, tag_end)
+            elif heading and heading[0] == name:
+                # The heading closest to the table wins, but a tab name wins
+                # over a heading inside the tab
+                if not from_tab:
+                    label = markup_text(unescape_js_string(body[heading[1]:tag_start])).strip() or None
+                    anchor = slugify(label)
+                heading = None
+
+def parse_bis_guide(body):
+    """
+    Parse every BiS table on a guide page (raw bytes)
+    Returns a list of tables, each a {'label', 'anchor', 'items'} dict with
+    items a list of {'slot', 'id'} dicts
+
+    Only the table slices are decoded and unescaped, the rest of the page is
+    scanned in place.
+    """
+    # The BiS table is inside a JavaScript WH.markup.printHtml("...") call
+    # Locate the content inside that JavaScript string
+    with metrics.timer('abis_stage_duration_seconds', stage='extract'):
+        span = find_guide_body(body)
+        if span is None:
+            logger.info('Could not find WH.markup.printHtml content, parsing the raw page')
+            sections = [(None, None, body.decode('utf-8', errors='replace'))]  # Fallback to raw HTML
+        else:
+            start, end = span
+            logger.debug('Found BBCode content in JavaScript', extra={'bytes': end - start})
+
+            # Find all [table]...[/table] sections
+            table_spans = list(find_bbcode_tables(body, start, end))
+            logger.debug('Found tables in BBCode', extra={'labels': [label for _, _, label, _ in table_spans]})
+
+            if table_spans:
+                sections = [(label, anchor, unescape_js_string(body[a:b])) for a, b, label, anchor in table_spans]
+            else:
+                sections = [(None, None, unescape_js_string(body[start:end]))]
+
+    with metrics.timer('abis_stage_duration_seconds', stage='table_parse'):
+        return [
+            {'label': label, 'anchor': anchor, 'items': parse_bis_rows(text)}
+            for label, anchor, text in sections
+        ]
+
+def select_bis_table(tables, url):
+    """
+    Pick the table the URL hash points at, matching it against the tab and
+    heading names of the guide; falls back to the fixed table positions
+    """
+    fragment = slugify(urlsplit(url).fragment)
+    if fragment:
+        # Heading labels have no tab-group prefix, so "#bis-items-raid" has to
+        # match "Raid" through the prefixes of the page's tab groups
+        prefixes = {DEFAULT_TAB_GROUP}
+        for table in tables:
+            label = slugify(table['label'])
+            if label and table['anchor'] and table['anchor'].endswith('-' + label):
+                prefixes.add(table['anchor'][:-len(label) - 1])
+        for table in tables:
+            label = slugify(table['label'])
+            if fragment == table['anchor'] or (label and (fragment == label or any(fragment == f'{prefix}-{label}' for prefix in prefixes))):
+                logger.debug('Extracting table %r for #%s', table['label'], fragment)
+                return table
+
+    table_index = get_bis_table_index(url)
+    if table_index < len(tables):
+        return tables[table_index]
+
+    logger.info('Requested table not found, using first table', extra={'url': url, 'table': table_index + 1})
+    return tables[0]
+
+def scrape_wowhead_items(url, fetch_info=None):
+    """
+    Scrape item IDs with slots from a Wowhead BiS gear guide URL
+
+    Supports hash anchors to select specific BiS tables, matched against the
+    guide's own tab and heading names:
+    - #bis-items-overall (default)
+    - #bis-items-sanlayn (Death Knight hero talent)
+    - #bis-items-deathbringer (Death Knight hero talent)
+    - #bis-items-raid
+    - #bis-items-mythic-plus
+
+    The page is parsed once and all of its tables are kept with the cached
+    page, so other anchors of the same guide need no further regex work.
+
+    Returns a list of dicts with 'slot' and 'id' keys
+    Example: [{'slot': 'Head', 'id': 237628}, {'slot': 'Trinket (Alternative)', 'id': 242396}, ...]
+
+    Pass a fetch_info dict to find out whether the page came from the cache
+    """
+    try:
+        return bis_table_items(get_parsed_page(url, parse_bis_guide, fetch_info), url)
+
+    except UpstreamError:
+        raise
+    except Exception as e:
+        record_scrape_failure(url, e, fetch_info)
+        return []
+
+def bis_table_items(tables, url):
+    """Copy the items of the table the URL points at out of a parsed guide"""
+    table = select_bis_table(tables, url)
+    return [dict(item) for item in table['items']]
+
+def scrape_wowhead_tables(url, fetch_info=None):
+    """
+    Scrape every BiS table of a Wowhead gear guide in one fetch
+    Returns a list of {'label', 'anchor', 'count', 'items'} dicts in page order
+    """
+    try:
+        return bis_table_summaries(get_parsed_page(url, parse_bis_guide, fetch_info))
+
+    except UpstreamError:
+        raise
+    except Exception as e:
+        record_scrape_failure(url, e, fetch_info)
+        return []
+
+def bis_table_summaries(tables):
+    """Copy every non-empty table of a parsed guide for a response"""
+    return [
+        {
+            'label': table['label'],
+            'anchor': table['anchor'],
+            'count': len(table['items']),
+            'items': [dict(item) for item in table['items']]
+        }
+        for table in tables if table['items']
+    ]
+
+def find_html_tables(body):
+    """Yield (start, end) offsets of the contents of each <table> in a page"""
+    return iter_table_spans(body, html=True)
+
+ENCHANT_HEADER_MARKERS = ('<b>Slot</b>', '<b>Best', '<b>Build</b>', '<b>Runeforge</b>')
+ENCHANT_SPELL_ID = re.compile(r'spell[=/](\d{5,7})')
+ENCHANT_ITEM_ID = re.compile(r'item[=/](\d{5,7})')
+LEADING_PAREN = re.compile(r'\s*\(')
+
+def split_html_cell(html, start, end):
+    """Split an HTML table cell on its <br> tags"""
+    options = []
+    pos = start
+    for name, _, _, tag_start, tag_end in iter_tags(html, start, end, html=True):
+        if name == 'br':
+            options.append(html[pos:tag_start])
+            pos = tag_end
+    options.append(html[pos:end])
+    return options
+
+def enchant_option_context(option):
+    """
+    Return the context of an enchant option, e.g. "Deathbringer ST" from
+    '<a href="/spell=...">...</a> (Deathbringer ST)', or "" if there is none
+    """
+    # The context is the parenthesised text after a link, closing at the end of the option
+    context_end = len(option.rstrip())
+    if not context_end or option[context_end - 1] != ')':
+        return ""
+    for name, closing, _, _, tag_end in iter_tags(option, html=True):
+        if name != 'a' or not closing:
+            continue
+        paren_match = LEADING_PAREN.match(option, tag_end)
+        if paren_match and paren_match.end() < context_end:
+            # Clean up: remove HTML tags, &nbsp;, normalize whitespace
+            context = markup_text(option, paren_match.end(), context_end - 1, html=True)
+            return ' '.join(context.replace('&nbsp;', ' ').split())
+    return ""
+
+def parse_enchant_tables(body):
+    """
+    Parse the enchant tables of an enchants guide page (raw bytes)
+    Returns a list of {'slot', 'enchants': [{'id', 'type', 'context'}, ...]} dicts
+    """
+    # Extract ALL tables (not just the first one), decoding only the tables
+    # This handles cases where weapon enchants are in a separate table (e.g., Frost DK)
+    with metrics.timer('abis_stage_duration_seconds', stage='extract'):
+        all_tables = [body[a:b].decode('utf-8', errors='replace') for a, b in find_html_tables(body)]
+
+    if not all_tables:
+        return []
+
+    with metrics.timer('abis_stage_duration_seconds', stage='enchant_parse'):
+        return parse_enchant_rows(all_tables)
+
+def parse_enchant_rows(all_tables):
+    """Reduce decoded enchant tables to {'slot', 'enchants'} dicts"""
+    # Parse each row to extract slot and enchant ID
+    enchants_with_slots = []
+
+    # Define valid enchantable slots (exclude consumables like flasks, potions, food, etc.)
+    valid_enchant_slots = {
+        'Weapon', 'Main Hand', 'Off Hand', 'Cloak', 'Chest', 'Bracers', 'Wrists',
+        'Legs', 'Boots', 'Hands', 'Ring', 'Ring - Regular', 'Ring - Cursed',
+        'Shattering Blade', 'Two-Hand', 'All other builds'  # DK weapon build names
+    }
+
+    # Process all tables
+    for table_html in all_tables:
+        for cells in iter_table_rows(table_html, html=True):
+            # Skip header rows (contains <b>Slot</b>, <b>Build</b>, <b>Runeforge</b>, etc.)
+            if any(marker in table_html[a:b] for a, b in cells for marker in ENCHANT_HEADER_MARKERS):
+                continue
+
+            if len(cells) < 2:
+                continue
+
+            # First cell is the slot/build name
+            slot_name = markup_text(table_html, *cells[0], html=True).strip()
+
+            # Skip empty slot names or non-enchant slots (flasks, potions, food, gems, etc.)
+            if not slot_name or slot_name not in valid_enchant_slots:
+                continue
+
+            # Second cell contains the enchant links, one option per <br>
+            # Collect ALL enchant options with their context (Hero Talent, ST/AoE, etc.)
+            enchant_list = []
+
+            for option in split_html_cell(table_html, *cells[1]):
+                # Look for spell ID or item ID
+                spell_match = ENCHANT_SPELL_ID.search(option)
+                item_match = ENCHANT_ITEM_ID.search(option)
+
+                enchant_id = None
+                if spell_match:
+                    enchant_id = int(spell_match.group(1))
+                    enchant_type = 'spell'
+                elif item_match:
+                    enchant_id = int(item_match.group(1))
+                    enchant_type = 'item'
+
+                if not enchant_id:
                     continue
 
-                # Store all enchant options for this slot
-                enchants_with_slots.append({
-                    'slot': slot_name,
-                    'enchants': enchant_list  # List of {id, context} objects
+                enchant_list.append({
+                    'id': enchant_id,
+                    'type': enchant_type,  # what the guide links to, for metadata lookups
+                    'context': enchant_option_context(option)
                 })
 
-        return enchants_with_slots
+            if not enchant_list:
+                continue
 
+            # Store all enchant options for this slot
+            enchants_with_slots.append({
+                'slot': slot_name,
+                'enchants': enchant_list  # List of {id, type, context} objects
+            })
+
+    return enchants_with_slots
+
+def scrape_wowhead_enchants(url, fetch_info=None):
+    """
+    Scrape enchant IDs from a Wowhead enchants guide URL
+    Returns list of enchant spell IDs (one per slot)
+
+    Pass a fetch_info dict to find out whether the page came from the cache
+    """
+    try:
+        return enchant_slots(get_parsed_page(url, parse_enchant_tables, fetch_info))
+
+    except UpstreamError:
+        raise
     except Exception as e:
+        record_scrape_failure(url, e, fetch_info)
         return []
 
+def enchant_slots(enchants_with_slots):
+    """Copy parsed enchant slots for a response"""
+    return [
+        {'slot': enchant['slot'], 'enchants': [dict(enc) for enc in enchant['enchants']]}
+        for enchant in enchants_with_slots
+    ]
+
 def generate_enchant_url(bis_url):
     """
     Convert a BiS gear URL to an enchants URL
@@ -342,9 +2230,964 @@ def generate_enchant_url(bis_url):
             return bis_url.replace('bis-gear', 'enchants-gems-pve-dps')
     return None
 
-@app.route('/')
-def home():
-    """Home page with role selection"""
+def scrape_result_key(url, role):
+    """Key identifying a /scrape-full result: page, selected table, role and parser version"""
+    fragment = urlsplit(url.strip()).fragment.lower()
+    return (normalize_url(url), fragment, role, PARSER_VERSION)
+
+def check_full_request(url, role, import_format='legacy'):
+    """Validate a decoded /scrape-full URL, role and import format, returns an error message or None"""
+    # Validate it's a Wowhead URL
+    if 'wowhead.com' not in url:
+        return 'Only Wowhead URLs are supported'
+
+    # Validate role
+    if role not in ['tank', 'dps', 'healer']:
+        return 'Role must be tank, dps, or healer'
+
+    if import_format not in IMPORT_FORMATS:
+        return 'Format must be legacy or compact'
+
+    return None
+
+def get_full_result(url, role):
+    """
+    Return (payload, status) for a validated /scrape-full request, using a
+    precomputed result when available and sharing in-flight identical scrapes
+    """
+    # Serve a precomputed result (from the pre-warming crawler or an earlier
+    # identical request) without touching Wowhead
+    precomputed = get_precomputed_result(url, role)
+    if precomputed is not None:
+        return precomputed, 200
+
+    # Identical requests arriving together share one scrape
+    result, shared = scrape_flight.do(scrape_result_key(url, role), build_full_result, url, role)
+    payload, status = result
+    if shared:
+        payload = dict(payload, coalesced=True)
+    return payload, status
+
+def get_precomputed_result(url, role):
+    """
+    Return a stored /scrape-full payload that is younger than the page TTL,
+    marked as precomputed, or None
+    """
+    if page_store is None:
+        return None
+
+    stored = page_store.get_result(json.dumps(scrape_result_key(url, role)))
+    if stored is None:
+        metrics.inc('abis_cache_lookups_total', cache='result', result='miss')
+        return None
+
+    payload, computed_at = stored
+    age = max(0.0, time.time() - computed_at)
+    if age >= PAGE_CACHE_TTL:
+        metrics.inc('abis_cache_lookups_total', cache='result', result='expired')
+        return None
+
+    metrics.inc('abis_cache_lookups_total', cache='result', result='hit')
+
+    return dict(
+        payload,
+        cache={'gear': 'precomputed', 'enchants': 'precomputed'},
+        stale=False,
+        age=int(age),
+    )
+
+def build_import_string(gear_items, enchants_with_slots):
+    """
+    Build the addon import string from scraped gear and enchants
+    Format: "BIS##'slot':id;'slot':id;;ENCHANT##'slot':id~context|id;'slot':id"
+    """
+    parts = []
+
+    # Add BiS gear items with slots
+    if gear_items:
+        bis_items = []
+        for item in gear_items:
+            bis_items.append(f"'{item['slot']}':{item['id']}")
+        parts.append("BIS##" + ";".join(bis_items))
+
+    # Add enchants with slots (multiple enchants per slot separated by |)
+    # Format: 'slot':id~context|id~context
+    if enchants_with_slots:
+        enchant_items = []
+        for enchant in enchants_with_slots:
+            # Build enchant options as id~context pairs, joined by |
+            enchant_options = []
+            for enc in enchant['enchants']:
+                if enc['context']:
+                    enchant_options.append(f"{enc['id']}~{enc['context']}")
+                else:
+                    enchant_options.append(str(enc['id']))
+
+            enchant_str = "|".join(enchant_options)
+            enchant_items.append(f"'{enchant['slot']}':{enchant_str}")
+        parts.append("ENCHANT##" + ";".join(enchant_items))
+
+    return ";;".join(parts)
+
+# Compact import strings: "ABIS1:" + unpadded base64url of varint-packed data
+COMPACT_IMPORT_PREFIX = 'ABIS1:'
+COMPACT_PAYLOAD_PATTERN = re.compile(r'[A-Za-z0-9_-]*')
+IMPORT_FORMATS = ('legacy', 'compact')
+
+# Full import strings end with a hash of their content (the first
+# IMPORT_HASH_LENGTH hex digits of the SHA-1 of the legacy import string).
+# Delta strings "ABISD1:<base hash>:<new hash>:<base64url>" carry only the
+# slots that changed between two imports.
+IMPORT_HASH_LENGTH = 12
+IMPORT_HASH_PATTERN = re.compile(r'[0-9a-f]{%d}' % IMPORT_HASH_LENGTH)
+DELTA_IMPORT_PREFIX = 'ABISD1:'
+LEGACY_IMPORT_PAIR = re.compile(r"'([^']+)':(\d+(?:~[^|]*)?(?:\|\d+(?:~[^|]*)?)*)")
+
+# Slot names with a fixed index in compact import strings. Part of format
+# version 1: only ever append, and keep COMPACT_SLOTS in AndrewsBISUI.lua the same
+COMPACT_SLOTS = (
+    'Head', 'Neck', 'Shoulders', 'Cloak', 'Chest', 'Wrists', 'Hands', 'Waist',
+    'Legs', 'Feet', 'Finger 1', 'Finger 2', 'Trinket 1', 'Trinket 2', 'Main Hand',
+    'Off Hand', 'Trinket (Alternative)', 'Finger (Alternative)', 'Main Hand (Alternative)',
+    'Bracers', 'Boots', 'Ring', 'Weapon', 'Two-Hand',
+)
+COMPACT_SLOT_INDEX = {slot: index for index, slot in enumerate(COMPACT_SLOTS)}
+
+def write_varint(out, value):
+    """Append an unsigned LEB128 varint to a bytearray"""
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def zigzag(value):
+    """Map a signed int to an unsigned one so small deltas stay small"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+class CompactPacker:
+    """
+    Writes the varint-packed data of compact import strings: a string table
+    (slot names without a fixed index and enchant contexts) followed by the
+    sections added with gear(), gear_slots() and enchants()
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._string_index = {}
+        self.body = bytearray()
+
+    def varint(self, value):
+        write_varint(self.body, value)
+
+    def string_ref(self, text):
+        if text not in self._string_index:
+            self._string_index[text] = len(self.strings)
+            self.strings.append(text)
+        return self._string_index[text]
+
+    def slot(self, slot):
+        index = COMPACT_SLOT_INDEX.get(slot)
+        self.varint(index if index is not None else len(COMPACT_SLOTS) + self.string_ref(slot))
+
+    def gear(self, gear_items):
+        """count, then per item: slot, zigzag(id - previous item id)"""
+        self.varint(len(gear_items))
+        previous = 0
+        for item in gear_items:
+            self.slot(item['slot'])
+            self.varint(zigzag(item['id'] - previous))
+            previous = item['id']
+
+    def gear_slots(self, slot_items):
+        """count, then per (slot, item ids): slot, id count, zigzag id deltas"""
+        self.varint(len(slot_items))
+        previous = 0
+        for slot, item_ids in slot_items:
+            self.slot(slot)
+            self.varint(len(item_ids))
+            for item_id in item_ids:
+                self.varint(zigzag(item_id - previous))
+                previous = item_id
+
+    def enchants(self, enchants_with_slots):
+        """
+        count, then per slot: slot, option count, then per option:
+        zigzag(id - previous enchant id), context (0 = none, n = strings[n - 1])
+        """
+        self.varint(len(enchants_with_slots))
+        previous = 0
+        for enchant in enchants_with_slots:
+            self.slot(enchant['slot'])
+            self.varint(len(enchant['enchants']))
+            for option in enchant['enchants']:
+                self.varint(zigzag(option['id'] - previous))
+                previous = option['id']
+                self.varint(self.string_ref(option['context']) + 1 if option['context'] else 0)
+
+    def encode(self):
+        """Return the string table and sections as unpadded base64url"""
+        packed = bytearray()
+        write_varint(packed, len(self.strings))
+        for text in self.strings:
+            encoded = text.encode('utf-8')
+            write_varint(packed, len(encoded))
+            packed += encoded
+        packed += self.body
+        return base64.urlsafe_b64encode(bytes(packed)).rstrip(b'=').decode('ascii')
+
+class CompactReader:
+    """Reads back data written by CompactPacker, raising ValueError when it is malformed"""
+
+    def __init__(self, payload):
+        if not COMPACT_PAYLOAD_PATTERN.fullmatch(payload):
+            raise ValueError('invalid characters')
+        self.data = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+        self.pos = 0
+        self.strings = []
+        for _ in range(self.varint()):
+            length = self.varint()
+            if self.pos + length > len(self.data):
+                raise ValueError('import string is incomplete')
+            self.strings.append(self.data[self.pos:self.pos + length].decode('utf-8', 'replace'))
+            self.pos += length
+
+    def varint(self):
+        value = 0
+        shift = 0
+        while True:
+            if self.pos >= len(self.data):
+                raise ValueError('import string is incomplete')
+            byte = self.data[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def delta(self):
+        value = self.varint()
+        return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    def slot(self):
+        index = self.varint()
+        if index < len(COMPACT_SLOTS):
+            return COMPACT_SLOTS[index]
+        if index - len(COMPACT_SLOTS) < len(self.strings):
+            return self.strings[index - len(COMPACT_SLOTS)]
+        raise ValueError(f'unknown slot {index}')
+
+    def context(self):
+        index = self.varint()
+        if index > len(self.strings):
+            raise ValueError(f'unknown context {index}')
+        return self.strings[index - 1] if index else ''
+
+    def gear(self):
+        items = []
+        item_id = 0
+        for _ in range(self.varint()):
+            slot = self.slot()
+            item_id += self.delta()
+            items.append({'slot': slot, 'id': item_id})
+        return items
+
+    def gear_slots(self):
+        slot_items = []
+        item_id = 0
+        for _ in range(self.varint()):
+            slot = self.slot()
+            item_ids = []
+            for _ in range(self.varint()):
+                item_id += self.delta()
+                item_ids.append(item_id)
+            slot_items.append((slot, item_ids))
+        return slot_items
+
+    def enchants(self):
+        enchants_with_slots = []
+        enchant_id = 0
+        for _ in range(self.varint()):
+            slot = self.slot()
+            options = []
+            for _ in range(self.varint()):
+                enchant_id += self.delta()
+                options.append({'id': enchant_id, 'context': self.context()})
+            enchants_with_slots.append({'slot': slot, 'enchants': options})
+        return enchants_with_slots
+
+def build_compact_import_string(gear_items, enchants_with_slots):
+    """
+    Build the compact import string ("ABIS1:<base64url>") from scraped gear
+    and enchants. The packed data is a sequence of varints:
+
+        strings   count, then per string: UTF-8 length, bytes
+        gear      count, then per item: slot, zigzag(id - previous item id)
+        enchants  count, then per slot: slot, option count, then per option:
+                  zigzag(id - previous enchant id), context (0 = none,
+                  n = strings[n - 1])
+
+    A slot below len(COMPACT_SLOTS) is an index into it, anything above
+    points into the strings (slot - len(COMPACT_SLOTS)).
+    """
+    packer = CompactPacker()
+    packer.gear(gear_items)
+    packer.enchants(enchants_with_slots)
+    return COMPACT_IMPORT_PREFIX + packer.encode()
+
+def legacy_import_hash(import_string):
+    """Import hash of a legacy import string (without its HASH## section)"""
+    return hashlib.sha1(import_string.encode('utf-8')).hexdigest()[:IMPORT_HASH_LENGTH]
+
+def import_hash(gear_items, enchants_with_slots):
+    """Short hash identifying the content of an import, whatever its format"""
+    return legacy_import_hash(build_import_string(gear_items, enchants_with_slots))
+
+def payload_import_hash(payload):
+    """Import hash of a /scrape-full payload (results stored before 1.3.0 have none)"""
+    return payload.get('import_hash') or import_hash(payload['gear_items'], payload['enchants'])
+
+def tag_import_string(import_string, digest):
+    """
+    Append the import hash to a full import string, as a final ";;HASH##"
+    section (legacy) or ":<hash>" (compact); older addons ignore both
+    """
+    if import_string.startswith(COMPACT_IMPORT_PREFIX):
+        return f'{import_string}:{digest}'
+    return f'{import_string};;HASH##{digest}'
+
+def parse_import_string(import_string):
+    """
+    Read the gear and enchants back from a full import string (legacy or
+    compact, with or without its import hash). Returns (gear items,
+    enchants), raises ValueError when it is not one
+    """
+    text = import_string.strip()
+    if text.startswith(COMPACT_IMPORT_PREFIX):
+        reader = CompactReader(text[len(COMPACT_IMPORT_PREFIX):].partition(':')[0])
+        gear_items = reader.gear()
+        return gear_items, reader.enchants()
+
+    if not text.startswith(('BIS##', 'ENCHANT##')):
+        raise ValueError('unknown format')
+
+    gear_items = []
+    enchants_with_slots = []
+    for section in text.split(';;'):
+        name, _, content = section.partition('##')
+        for pair in content.split(';') if name in ('BIS', 'ENCHANT') else ():
+            match = LEGACY_IMPORT_PAIR.fullmatch(pair)
+            if not match:
+                raise ValueError(f'unreadable {name} entry')
+            slot, value = match.groups()
+            if name == 'BIS':
+                gear_items.append({'slot': slot, 'id': int(value)})
+                continue
+            options = []
+            for option in value.split('|'):
+                enchant_id, _, context = option.partition('~')
+                options.append({'id': int(enchant_id), 'context': context})
+            enchants_with_slots.append({'slot': slot, 'enchants': options})
+    return gear_items, enchants_with_slots
+
+def import_changes(base, current):
+    """
+    Compare two imports given as (gear items, enchants), the current one from
+    a scrape. Returns the gear slots whose items differ as [(slot, item ids)]
+    and the enchant slots whose options differ as enchants entries, in the
+    order of the current import; slots that are gone come last with nothing
+    in them
+    """
+    def gear_by_slot(gear_items):
+        slots = {}
+        for item in gear_items:
+            slots.setdefault(item['slot'], []).append(item['id'])
+        return slots
+
+    def enchants_by_slot(enchants_with_slots):
+        return {enchant['slot']: enchant['enchants'] for enchant in enchants_with_slots}
+
+    def options_key(options):
+        # Imports read from a string (or stored by older code) have no option types
+        return [(option['id'], option['context'] or '') for option in options]
+
+    base_gear, base_enchants = gear_by_slot(base[0]), enchants_by_slot(base[1])
+    gear, enchants = gear_by_slot(current[0]), enchants_by_slot(current[1])
+
+    gear_changes = [(slot, ids) for slot, ids in gear.items() if base_gear.get(slot) != ids]
+    gear_changes += [(slot, []) for slot in base_gear if slot not in gear]
+
+    enchant_changes = [
+        {
+            'slot': slot,
+            'enchants': [
+                {'id': option['id'], 'type': option['type'], 'context': option['context'] or ''}
+                for option in options
+            ]
+        }
+        for slot, options in enchants.items()
+        if slot not in base_enchants or options_key(base_enchants[slot]) != options_key(options)
+    ]
+    enchant_changes += [{'slot': slot, 'enchants': []} for slot in base_enchants if slot not in enchants]
+    return gear_changes, enchant_changes
+
+def build_delta_import_string(base_hash, new_hash, gear_changes, enchant_changes):
+    """
+    Build a delta import string ("ABISD1:<base hash>:<new hash>:<base64url>")
+    that turns the import base_hash into new_hash. Same string table and
+    encoding as compact import strings, followed by:
+
+        gear      count, then per slot: slot, item count, then per item:
+                  zigzag(id - previous item id); no items = slot removed
+        enchants  as in compact strings; no options = slot removed
+    """
+    packer = CompactPacker()
+    packer.gear_slots(gear_changes)
+    packer.enchants(enchant_changes)
+    return f'{DELTA_IMPORT_PREFIX}{base_hash}:{new_hash}:{packer.encode()}'
+
+# Recent imports by hash in this worker: (gear items, enchants, when this
+# worker last stored or touched it), most recently used last
+_recent_imports = OrderedDict()
+_recent_imports_lock = threading.Lock()
+_imports_pruned_at = 0.0
+
+def keep_recent_import(digest, gear_items, enchants_with_slots, touched_at):
+    """Keep an import in this worker's memory (call with _recent_imports_lock held)"""
+    _recent_imports[digest] = (gear_items, enchants_with_slots, touched_at)
+    _recent_imports.move_to_end(digest)
+    while len(_recent_imports) > RECENT_IMPORTS_MAX:
+        _recent_imports.popitem(last=False)
+
+def remember_import(digest, gear_items, enchants_with_slots):
+    """Keep an import by hash so later ?since=<hash> requests can get a delta"""
+    now = time.time()
+    with _recent_imports_lock:
+        recent = _recent_imports.get(digest)
+        if recent is not None and now - recent[2] < IMPORT_TOUCH_INTERVAL:
+            _recent_imports.move_to_end(digest)
+            return
+        keep_recent_import(digest, gear_items, enchants_with_slots, now)
+
+    if page_store is not None:
+        # Storing it again also resets its age, so imports still being served stay
+        page_store.put_import(digest, gear_items, enchants_with_slots)
+        prune_imports(now)
+
+def recall_import(digest):
+    """
+    Return the (gear items, enchants) of a known import hash, or None
+    A base that clients still send as ?since= is kept for another TTL
+    """
+    now = time.time()
+    with _recent_imports_lock:
+        recent = _recent_imports.get(digest)
+        if recent is not None:
+            touch = page_store is not None and now - recent[2] >= IMPORT_TOUCH_INTERVAL
+            keep_recent_import(digest, recent[0], recent[1], now if touch else recent[2])
+    if recent is not None:
+        if touch:
+            page_store.touch_import(digest)
+        return recent[:2]
+
+    if page_store is None:
+        return None
+    stored = page_store.get_import(digest)
+    if stored is not None:
+        with _recent_imports_lock:
+            keep_recent_import(digest, stored[0], stored[1], now)
+        page_store.touch_import(digest)
+    return stored
+
+def prune_imports(now):
+    """Delete stored imports past IMPORT_HISTORY_TTL, at most every IMPORT_PRUNE_INTERVAL per worker"""
+    global _imports_pruned_at
+    if now - _imports_pruned_at < IMPORT_PRUNE_INTERVAL:
+        return
+    _imports_pruned_at = now
+    page_store.prune_imports(now - IMPORT_HISTORY_TTL)
+
+def remember_payload_imports(payload):
+    """Remember the imports of a successful /scrape-full payload, including tables=all"""
+    remember_import(payload_import_hash(payload), payload['gear_items'], payload['enchants'])
+    for table in payload.get('tables', ()):
+        remember_import(table['import_hash'], table['items'], payload['enchants'])
+
+def import_update(payload, import_format, since=None, previous=None):
+    """
+    Answer a /scrape-full request that names the import the client already
+    has (?since=<import hash> or ?previous=<import string>).
+    Returns (payload, status):
+      - ({'import_hash'}, 204) when the import has not changed
+      - a delta payload with an ABISD1: import string when the base is known
+      - the full payload with delta: false when it is not
+      - an error payload with 400 for a malformed since/previous
+    """
+    base = None
+    if previous:
+        previous = previous.strip()
+        if previous.startswith(DELTA_IMPORT_PREFIX):
+            # A delta string names the import it produces
+            parts = previous[len(DELTA_IMPORT_PREFIX):].split(':')
+            since = parts[1] if len(parts) > 1 else ''
+        else:
+            try:
+                base = parse_import_string(previous)
+            except ValueError as e:
+                return {'success': False, 'error': f'Could not read the previous import string: {e}'}, 400
+            since = import_hash(*base)
+
+    if not IMPORT_HASH_PATTERN.fullmatch(since or ''):
+        return {'success': False, 'error': f'since must be a {IMPORT_HASH_LENGTH}-character import hash'}, 400
+
+    current = payload_import_hash(payload)
+    if since == current:
+        return {'import_hash': current}, 204
+
+    if base is None:
+        base = recall_import(since)
+    if base is None:
+        return dict(with_import_format(payload, import_format), delta=False), 200
+
+    gear_changes, enchant_changes = import_changes(base, (payload['gear_items'], payload['enchants']))
+    delta = {
+        'success': True,
+        'delta': True,
+        'base_hash': since,
+        'import_hash': current,
+        'gear_changes': [{'slot': slot, 'items': item_ids} for slot, item_ids in gear_changes],
+        'enchant_changes': enchant_changes,
+        'import_string': build_delta_import_string(since, current, gear_changes, enchant_changes),
+    }
+    for name in ('gear_url', 'enchant_url', 'role', 'cache', 'stale', 'age', 'coalesced'):
+        if name in payload:
+            delta[name] = payload[name]
+    return delta, 200
+
+def with_import_format(payload, import_format):
+    """
+    Return a /scrape-full payload with its import strings (including those
+    of tables=all) in the requested format; stored results keep the legacy one
+    """
+    if import_format != 'compact' or not payload.get('success'):
+        return payload
+
+    payload = dict(payload, import_string=tag_import_string(
+        build_compact_import_string(payload['gear_items'], payload['enchants']),
+        payload_import_hash(payload),
+    ))
+    if 'tables' in payload:
+        payload['tables'] = [
+            dict(table, import_string=tag_import_string(
+                build_compact_import_string(table['items'], payload['enchants']),
+                table['import_hash'],
+            ))
+            for table in payload['tables']
+        ]
+    return payload
+
+def build_full_result(url, role):
+    """
+    Scrape BiS gear and role enchants for a validated URL and build the
+    /scrape-full payload including the import string
+    Returns (payload dict, HTTP status)
+    """
+    enchant_url = role_enchant_url(url, role)
+
+    # Scrape BiS gear and enchants concurrently so the latency is the slower
+    # of the two upstream requests instead of their sum
+    gear_fetch = {}
+    enchant_fetch = {}
+    executor = get_upstream_executor()
+    gear_future = submit_in_context(executor, scrape_wowhead_items, url, gear_fetch)
+    enchant_future = submit_in_context(executor, scrape_wowhead_enchants, enchant_url, enchant_fetch)
+    gear_items = gear_future.result()
+    enchants_with_slots = enchant_future.result()
+
+    payload, status = full_result_payload(url, role, gear_items, enchants_with_slots, gear_fetch, enchant_fetch)
+
+    # Keep fresh, complete results so later identical requests skip fetching
+    # and parsing - never one where a scrape failed and came back empty
+    if page_store is not None and result_storable(payload, status, gear_fetch, enchant_fetch):
+        page_store.put_result(json.dumps(scrape_result_key(url, role)), payload)
+
+    return payload, status
+
+def role_enchant_url(url, role):
+    """Enchants URL of a gear guide - bis-gear replaced by enchants-gems-pve-{role}"""
+    return url.replace('bis-gear', f'enchants-gems-pve-{role}')
+
+def full_result_payload(url, role, gear_items, enchants_with_slots, gear_fetch, enchant_fetch):
+    """
+    Build the /scrape-full payload including the import string from scraped
+    gear and enchants. Returns (payload dict, HTTP status)
+    """
+    if not gear_items:
+        return {
+            'success': False,
+            'error': 'No gear items found on that page. Make sure it\'s a BiS guide URL.'
+        }, 404
+
+    # Allow BiS gear without enchants
+    if not enchants_with_slots:
+        pass  # Silently continue without enchants
+
+    with metrics.timer('abis_stage_duration_seconds', stage='import_build'):
+        import_string = build_import_string(gear_items, enchants_with_slots)
+        digest = legacy_import_hash(import_string)
+
+    payload = {
+        'success': True,
+        'gear_count': len(gear_items),
+        'enchant_count': len(enchants_with_slots),
+        'gear_items': gear_items,
+        'enchants': enchants_with_slots,
+        'import_string': tag_import_string(import_string, digest),
+        'import_hash': digest,
+        'gear_url': url,
+        'enchant_url': role_enchant_url(url, role),
+        'role': role,
+        'cache': {'gear': gear_fetch.get('cache'), 'enchants': enchant_fetch.get('cache')},
+        **page_freshness(gear_fetch, enchant_fetch)
+    }
+
+    return payload, 200
+
+def build_table_results(url, enchants_with_slots):
+    """
+    Return every BiS table of a guide with an import string per table, all
+    sharing the same role enchants
+    """
+    return add_table_import_strings(scrape_wowhead_tables(url), enchants_with_slots)
+
+def add_table_import_strings(tables, enchants_with_slots):
+    """Add an import string and its import hash to each table summary, returns the tables"""
+    for table in tables:
+        with metrics.timer('abis_stage_duration_seconds', stage='import_build'):
+            import_string = build_import_string(table['items'], enchants_with_slots)
+            table['import_hash'] = legacy_import_hash(import_string)
+            table['import_string'] = tag_import_string(import_string, table['import_hash'])
+    return tables
+
+# Item/enchant metadata (?enrich=1)
+METADATA_KINDS = ('item', 'spell')
+TOOLTIP_ITEM_LEVEL = re.compile(r'Item Level (?:<!--ilvl-->)?(\d+)')
+
+def tooltip_metadata(kind, data):
+    """Reduce a tooltip API answer to the metadata returned by ?enrich=1 (None if it has no name)"""
+    if not isinstance(data, dict) or not data.get('name'):
+        return None
+    level = TOOLTIP_ITEM_LEVEL.search(data.get('tooltip') or '') if kind == 'item' else None
+    return {
+        'name': data['name'],
+        'icon': data.get('icon'),
+        'quality': data.get('quality'),
+        'item_level': int(level.group(1)) if level else None,
+    }
+
+class WowheadTooltipSource:
+    """
+    Item and spell metadata from the Wowhead tooltip API
+    ({base_url}/tooltip/item/<id>, {base_url}/tooltip/spell/<id>)
+
+    Any object with the same lookup() can be installed as metadata_source
+    instead, e.g. a local stand-in in tests.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def lookup(self, kind, ids):
+        """
+        Look up ids of one kind ('item' or 'spell') one after the other.
+        Returns {id: metadata, or None when the id does not exist}; ids that
+        could not be looked up right now (throttled, network errors) are left
+        out, and the rest of the batch with them once the budget runs out
+        """
+        found = {}
+        for item_id in ids:
+            try:
+                found[item_id] = self.fetch(kind, item_id)
+            except UpstreamError as e:
+                logger.info('Metadata lookups paused', extra={'kind': kind, 'id': item_id, 'error': str(e)})
+                break
+            except (requests.RequestException, ValueError) as e:
+                logger.info('Metadata lookup failed', extra={'kind': kind, 'id': item_id, 'error': str(e)})
+        return found
+
+    def fetch(self, kind, item_id):
+        """Fetch the metadata of one id, through metadata_limiter"""
+        session = get_upstream_session()
+        with metadata_limiter.request():
+            try:
+                response = session.get(
+                    f'{self.base_url}/tooltip/{kind}/{item_id}',
+                    timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT),
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.inc('abis_upstream_responses_total', status='error')
+                raise UpstreamUnavailable('Could not reach Wowhead', retryable=True) from e
+            metrics.inc('abis_upstream_responses_total', status=response.status_code)
+            if response.status_code == 404:
+                return None
+            check_upstream_status(response.status_code, response.headers)
+            response.raise_for_status()
+            return tooltip_metadata(kind, response.json())
+
+metadata_source = WowheadTooltipSource(METADATA_BASE_URL)
+
+# Metadata by (kind, id) in this worker: (metadata or None, fetched_at), most recently used last
+_metadata_cache = OrderedDict()
+_metadata_lock = threading.Lock()
+
+# (kind, id) queued for or being looked up by this worker's metadata threads
+_metadata_pending = set()
+_metadata_executor = None
+_metadata_executor_pid = None
+
+def metadata_fresh(entry, now):
+    """Whether a (metadata, fetched_at) entry is younger than its TTL"""
+    data, fetched_at = entry
+    return now - fetched_at < (METADATA_TTL if data is not None else METADATA_MISS_TTL)
+
+def cache_metadata(kind, entries):
+    """Keep {id: (metadata, fetched_at)} entries in this worker's memory"""
+    with _metadata_lock:
+        for item_id, entry in entries.items():
+            _metadata_cache[(kind, item_id)] = entry
+            _metadata_cache.move_to_end((kind, item_id))
+        while len(_metadata_cache) > METADATA_MEMORY_MAX:
+            _metadata_cache.popitem(last=False)
+
+def get_metadata_executor():
+    """Return this worker's thread pool for background metadata lookups"""
+    global _metadata_executor, _metadata_executor_pid
+
+    pid = os.getpid()
+    if _metadata_executor is not None and _metadata_executor_pid == pid:
+        return _metadata_executor
+
+    with _metadata_lock:
+        if _metadata_executor is None or _metadata_executor_pid != pid:
+            _metadata_executor = ThreadPoolExecutor(
+                max_workers=max(1, METADATA_CONCURRENCY),
+                thread_name_prefix='abis-metadata',
+            )
+            _metadata_executor_pid = pid
+            _metadata_pending.clear()  # lookups queued before a fork never run here
+
+    return _metadata_executor
+
+def queue_metadata_lookup(kind, ids):
+    """Look up ids of one kind in the background, unless they already are"""
+    executor = get_metadata_executor()
+    with _metadata_lock:
+        ids = [item_id for item_id in ids if (kind, item_id) not in _metadata_pending]
+        _metadata_pending.update((kind, item_id) for item_id in ids)
+    # One batch per lookup thread
+    batches = max(1, METADATA_CONCURRENCY)
+    for start in range(min(batches, len(ids))):
+        executor.submit(lookup_metadata, kind, ids[start::batches])
+
+def lookup_metadata(kind, ids):
+    """Look up ids with metadata_source and keep what it found in memory and on disk"""
+    try:
+        looked_up = metadata_source.lookup(kind, ids)
+        fetched_at = time.time()
+        cache_metadata(kind, {item_id: (data, fetched_at) for item_id, data in looked_up.items()})
+        if page_store is not None and looked_up:
+            page_store.put_metadata(kind, looked_up, fetched_at)
+    except Exception:
+        logger.exception('Metadata lookup failed')
+    finally:
+        # Ids that were not found are asked for again by the next request
+        with _metadata_lock:
+            _metadata_pending.difference_update((kind, item_id) for item_id in ids)
+
+def get_metadata(wanted):
+    """
+    Resolve {kind: ids} to {kind: {id: metadata or None}} from memory, then
+    the on-disk store. Ids never seen (or past their TTL) are left out and
+    looked up in the background, so a later request finds them
+    """
+    now = time.time()
+    resolved = {}
+    for kind, ids in wanted.items():
+        found = resolved[kind] = {}
+        missing = []
+        with _metadata_lock:
+            for item_id in ids:
+                entry = _metadata_cache.get((kind, item_id))
+                if entry is not None and metadata_fresh(entry, now):
+                    _metadata_cache.move_to_end((kind, item_id))
+                    found[item_id] = entry[0]
+                else:
+                    missing.append(item_id)
+        if found:
+            metrics.inc('abis_cache_lookups_total', len(found), cache='metadata', result='hit')
+
+        if missing and page_store is not None:
+            stored = {
+                item_id: entry for item_id, entry in page_store.get_metadata(kind, missing).items()
+                if metadata_fresh(entry, now)
+            }
+            if stored:
+                cache_metadata(kind, stored)
+                found.update((item_id, entry[0]) for item_id, entry in stored.items())
+                metrics.inc('abis_cache_lookups_total', len(stored), cache='metadata', result='disk')
+                missing = [item_id for item_id in missing if item_id not in stored]
+
+        if missing:
+            metrics.inc('abis_cache_lookups_total', len(missing), cache='metadata', result='miss')
+            queue_metadata_lookup(kind, missing)
+    return resolved
+
+def payload_metadata_ids(payload):
+    """The item and enchant ids of a scrape payload (including tables and delta changes) by metadata kind"""
+    wanted = {kind: set() for kind in METADATA_KINDS}
+    gear = list(payload.get('items', ())) + list(payload.get('gear_items', ()))
+    for table in payload.get('tables', ()):
+        gear += table['items']
+    wanted['item'].update(item['id'] for item in gear)
+    for change in payload.get('gear_changes', ()):
+        wanted['item'].update(change['items'])
+    for enchant in list(payload.get('enchants', ())) + list(payload.get('enchant_changes', ())):
+        for option in enchant['enchants']:
+            wanted[option['type']].add(option['id'])
+    return wanted
+
+def enrich_payload(payload):
+    """
+    Return a scrape payload with the metadata of all of its ids, as
+    metadata: {'items': {id: {...} or null}, 'spells': {...}}, and whether
+    every id could be resolved (metadata_complete is false while some are
+    still being looked up)
+    """
+    wanted = payload_metadata_ids(payload)
+    with metrics.timer('abis_stage_duration_seconds', stage='enrich'):
+        resolved = get_metadata(wanted)
+    return dict(
+        payload,
+        metadata={
+            f'{kind}s': {str(item_id): resolved[kind][item_id] for item_id in sorted(resolved[kind])}
+            for kind in METADATA_KINDS
+        },
+        metadata_complete=all(len(resolved[kind]) == len(wanted[kind]) for kind in METADATA_KINDS),
+    )
+
+# Every class/spec BiS guide and the role whose enchants it uses - these pages
+# get nearly all of the traffic and are kept warm by the pre-warming crawler
+SPEC_GUIDES = [
+    ('death-knight', 'blood', 'tank'),
+    ('death-knight', 'frost', 'dps'),
+    ('death-knight', 'unholy', 'dps'),
+    ('demon-hunter', 'havoc', 'dps'),
+    ('demon-hunter', 'vengeance', 'tank'),
+    ('druid', 'balance', 'dps'),
+    ('druid', 'feral', 'dps'),
+    ('druid', 'guardian', 'tank'),
+    ('druid', 'restoration', 'healer'),
+    ('evoker', 'augmentation', 'dps'),
+    ('evoker', 'devastation', 'dps'),
+    ('evoker', 'preservation', 'healer'),
+    ('hunter', 'beast-mastery', 'dps'),
+    ('hunter', 'marksmanship', 'dps'),
+    ('hunter', 'survival', 'dps'),
+    ('mage', 'arcane', 'dps'),
+    ('mage', 'fire', 'dps'),
+    ('mage', 'frost', 'dps'),
+    ('monk', 'brewmaster', 'tank'),
+    ('monk', 'mistweaver', 'healer'),
+    ('monk', 'windwalker', 'dps'),
+    ('paladin', 'holy', 'healer'),
+    ('paladin', 'protection', 'tank'),
+    ('paladin', 'retribution', 'dps'),
+    ('priest', 'discipline', 'healer'),
+    ('priest', 'holy', 'healer'),
+    ('priest', 'shadow', 'dps'),
+    ('rogue', 'assassination', 'dps'),
+    ('rogue', 'outlaw', 'dps'),
+    ('rogue', 'subtlety', 'dps'),
+    ('shaman', 'elemental', 'dps'),
+    ('shaman', 'enhancement', 'dps'),
+    ('shaman', 'restoration', 'healer'),
+    ('warlock', 'affliction', 'dps'),
+    ('warlock', 'demonology', 'dps'),
+    ('warlock', 'destruction', 'dps'),
+    ('warrior', 'arms', 'dps'),
+    ('warrior', 'fury', 'dps'),
+    ('warrior', 'protection', 'tank'),
+]
+
+def spec_guide_url(class_slug, spec_slug):
+    """Wowhead BiS gear guide URL for a class/spec"""
+    return f'https://www.wowhead.com/guide/classes/{class_slug}/{spec_slug}/bis-gear'
+
+def prewarm_guide(url, role):
+    """Revalidate a guide's gear and enchant pages and store its /scrape-full result"""
+    for page_url in (url, url.replace('bis-gear', f'enchants-gems-pve-{role}')):
+        refresh_page(normalize_url(page_url))
+
+    payload, status = build_full_result(url, role)
+    if status != 200:
+        logger.warning('Pre-warm of a guide failed', extra={'url': url, 'role': role, 'error': payload.get('error')})
+
+def prewarm_all_guides():
+    """Crawl every class/spec guide with bounded concurrency"""
+    started = time.time()
+    request_id_var.set(f'prewarm-{uuid.uuid4().hex[:12]}')
+    debug_sampled_var.set(random.random() < LOG_DEBUG_SAMPLE)
+    with ThreadPoolExecutor(max_workers=PREWARM_CONCURRENCY, thread_name_prefix='abis-prewarm') as pool:
+        futures = [
+            submit_in_context(pool, prewarm_guide, spec_guide_url(class_slug, spec_slug), role)
+            for class_slug, spec_slug, role in SPEC_GUIDES
+        ]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning('Pre-warm failed', extra={'error': str(e)})
+
+    logger.info('Pre-warmed guides', extra={'guides': len(SPEC_GUIDES), 'seconds': round(time.time() - started, 1)})
+
+def run_prewarm_scheduler():
+    """
+    Pre-warm all guides every PREWARM_INTERVAL seconds
+
+    Every worker runs this loop, but the shared store records when the last
+    crawl happened and a non-blocking lock lets only one worker crawl at once.
+    """
+    while True:
+        try:
+            if page_store is None:
+                prewarm_all_guides()
+            else:
+                with page_store.lock('prewarm', blocking=False) as lock:
+                    last_run = float(page_store.get_meta('prewarm_last_run') or 0)
+                    if lock.acquired and time.time() - last_run >= PREWARM_INTERVAL:
+                        page_store.set_meta('prewarm_last_run', str(time.time()))
+                        prewarm_all_guides()
+        except Exception:
+            logger.exception('Pre-warm round failed')
+
+        time.sleep(PREWARM_INTERVAL)
+
+_prewarm_pid = None
+
+@app.before_request
+def start_prewarm_scheduler():
+    """Start this worker's pre-warming thread on its first request"""
+    global _prewarm_pid
+
+    if PREWARM_INTERVAL <= 0 or _prewarm_pid == os.getpid():
+        return
+
+    with _upstream_session_lock:
+        if _prewarm_pid != os.getpid():
+            _prewarm_pid = os.getpid()
+            threading.Thread(target=run_prewarm_scheduler, name='abis-prewarm', daemon=True).start()
+
+def render_home_page():
+    """HTML of the home page with role selection"""
     return """
     <html>
     <head>
@@ -429,6 +3272,19 @@ def home():
                 transition: all 0.3s;
             }
 
+            textarea {
+                width: 100%;
+                padding: 12px;
+                background: rgba(15, 52, 96, 0.8);
+                border: 2px solid #533e2d;
+                border-radius: 5px;
+                color: #fff;
+                font-family: 'Courier New', monospace;
+                font-size: 0.95em;
+                resize: vertical;
+            }
+
+            textarea:focus,
             input[type="text"]:focus {
                 outline: none;
                 border-color: #ffd700;
@@ -466,6 +3322,16 @@ def home():
                 margin-top: 20px;
             }
 
+            .format-toggle {
+                display: flex;
+                align-items: center;
+                gap: 8px;
+                margin-top: 15px;
+                font-weight: normal;
+                color: #ccc;
+                cursor: pointer;
+            }
+
             .btn-role {
                 flex: 1;
                 padding: 20px;
@@ -566,6 +3432,51 @@ def home():
                 line-height: 1.6;
             }
 
+            .item-list {
+                list-style: none;
+                margin-top: 15px;
+            }
+
+            .item-list li {
+                display: flex;
+                align-items: center;
+                gap: 10px;
+                padding: 4px 0;
+                color: #ccc;
+            }
+
+            .item-list img {
+                width: 18px;
+                height: 18px;
+                border-radius: 3px;
+            }
+
+            .item-list .quality-3 { color: #0070dd; }
+            .item-list .quality-4 { color: #a335ee; }
+            .item-list .quality-5 { color: #ff8000; }
+
+            .batch-status {
+                color: #ffd700;
+                margin: 15px 0;
+            }
+
+            .batch-entry {
+                background: rgba(15, 52, 96, 0.6);
+                border: 2px solid #4CAF50;
+                border-radius: 5px;
+                padding: 15px;
+                margin-top: 10px;
+            }
+
+            .batch-entry.error {
+                border-color: #f44336;
+            }
+
+            .batch-entry .item-ids {
+                margin: 10px 0;
+                font-size: 0.9em;
+            }
+
             .loading {
                 text-align: center;
                 color: #ffd700;
@@ -627,6 +3538,18 @@ def home():
                             ✨ Healer
                         </button>
                     </div>
+                    <label class="format-toggle">
+                        <input type="checkbox" id="compactFormat">
+                        Compact import string (needs AndrewsBISUI 1.2.0 or newer, also used for rosters)
+                    </label>
+                    <label class="format-toggle">
+                        <input type="checkbox" id="onlyChanges">
+                        Only the changes since my last scrape of this guide (needs AndrewsBISUI 1.3.0 or newer)
+                    </label>
+                    <label class="format-toggle">
+                        <input type="checkbox" id="showNames">
+                        List the gear with names and icons
+                    </label>
                 </div>
 
                 <div id="result">
@@ -635,10 +3558,22 @@ def home():
                         <span class="item-count" id="item-count"></span>
                     </div>
                     <div class="item-ids" id="item-ids"></div>
+                    <ul class="item-list" id="item-list"></ul>
                     <button class="btn btn-copy" onclick="copyToClipboard(event)">📋 Copy Import String</button>
                 </div>
             </div>
 
+            <div class="card">
+                <h2>👥 Scrape a Whole Roster</h2>
+                <div class="input-group">
+                    <label for="batchUrls">Wowhead BiS Gear URLs (one per line, optionally followed by tank, dps or healer):</label>
+                    <textarea id="batchUrls" rows="6" placeholder="https://www.wowhead.com/guide/classes/death-knight/blood/bis-gear tank&#10;https://www.wowhead.com/guide/classes/priest/discipline/bis-gear healer"></textarea>
+                </div>
+                <button class="btn" onclick="scrapeBatch()">Scrape All</button>
+                <div id="batch-status" class="batch-status"></div>
+                <div id="batch-results"></div>
+            </div>
+
             <div class="card">
                 <h2>📖 How to Use</h2>
                 <div class="info-section">
@@ -666,6 +3601,51 @@ def home():
         <script>
             let currentImportString = '';
 
+            function importFormatParam() {
+                return document.getElementById('compactFormat').checked ? '&format=compact' : '';
+            }
+
+            // Import hash of the last scrape of each guide and role, for ?since=
+            function importHashKey(bisUrl, role) {
+                return 'abis-import-hash:' + bisUrl + '|' + role;
+            }
+
+            function sinceParam(bisUrl, role) {
+                const lastHash = localStorage.getItem(importHashKey(bisUrl, role));
+                return document.getElementById('onlyChanges').checked && lastHash ? '&since=' + lastHash : '';
+            }
+
+            function enrichParam() {
+                return document.getElementById('showNames').checked ? '&enrich=1' : '';
+            }
+
+            // Counts scrapes, so a late name refresh never overwrites a newer result
+            let scrapeCount = 0;
+
+            // Names of items seen for the first time are looked up in the
+            // background; ask again a few times until they are all in
+            function refreshItemNames(url, scrape, attempt) {
+                if (attempt >= 5) {
+                    return;
+                }
+                setTimeout(async () => {
+                    try {
+                        // Revalidate instead of reusing the incomplete response from the browser cache
+                        const response = await fetch(url, {cache: 'no-cache'});
+                        const data = response.status === 200 ? await response.json() : null;
+                        if (scrape !== scrapeCount || !data || !data.success) {
+                            return;
+                        }
+                        renderItemList(data);
+                        if (!data.metadata_complete) {
+                            refreshItemNames(url, scrape, attempt + 1);
+                        }
+                    } catch (e) {
+                        // Keep what is shown
+                    }
+                }, 3000);
+            }
+
             async function scrapeRole(role) {
                 const bisUrl = document.getElementById('bisUrl').value;
                 const result = document.getElementById('result');
@@ -682,19 +3662,43 @@ def home():
                 result.className = '';
                 resultTitle.textContent = 'Loading...';
                 itemCount.textContent = '';
-                itemIds.innerHTML = '<div class="loading">⏳ Scraping BiS Gear & Enchants for ' + role.toUpperCase() + '...</div>';
+                const loading = document.createElement('div');
+                loading.className = 'loading';
+                loading.textContent = '⏳ Scraping BiS Gear & Enchants for ' + role.toUpperCase() + '...';
+                itemIds.replaceChildren(loading);
+                renderItemList(null);
+                const scrape = ++scrapeCount;
 
                 try {
-                    const url = '/scrape-full?url=' + encodeURIComponent(bisUrl) + '&role=' + role;
+                    const url = '/scrape-full?url=' + encodeURIComponent(bisUrl) + '&role=' + role + importFormatParam() + sinceParam(bisUrl, role) + enrichParam();
                     const response = await fetch(url);
+
+                    if (response.status === 204) {
+                        currentImportString = '';
+                        result.className = 'success';
+                        resultTitle.textContent = '✅ Up to date';
+                        itemCount.textContent = 'No changes';
+                        itemIds.textContent = 'Nothing changed since your last scrape of this guide - no need to re-import.';
+                        return;
+                    }
+
                     const data = await response.json();
 
                     if (data.success) {
+                        localStorage.setItem(importHashKey(bisUrl, role), data.import_hash);
                         currentImportString = data.import_string;
                         result.className = 'success';
                         resultTitle.textContent = '✅ Success!';
-                        itemCount.textContent = `Found ${data.gear_count} items + ${data.enchant_count} enchants`;
+                        if (data.delta) {
+                            itemCount.textContent = `${data.gear_changes.length} gear + ${data.enchant_changes.length} enchant slots changed`;
+                        } else {
+                            itemCount.textContent = `Found ${data.gear_count} items + ${data.enchant_count} enchants`;
+                        }
                         itemIds.textContent = data.import_string;
+                        renderItemList(data);
+                        if (data.metadata && !data.metadata_complete) {
+                            refreshItemNames(url, scrape, 0);
+                        }
                     } else {
                         result.className = 'error';
                         resultTitle.textContent = '❌ Error';
@@ -709,10 +3713,146 @@ def home():
                 }
             }
 
+            // Gear of a scrape (or the changed gear of an update) with names and icons from ?enrich=1
+            function renderItemList(data) {
+                const list = document.getElementById('item-list');
+                list.replaceChildren();
+                if (!data || !data.metadata) {
+                    return;
+                }
+                const rows = data.delta
+                    ? data.gear_changes.flatMap(change => change.items.length
+                        ? change.items.map(id => ({slot: change.slot, id: id}))
+                        : [{slot: change.slot, id: null}])
+                    : data.gear_items;
+                for (const row of rows) {
+                    const li = document.createElement('li');
+                    const info = row.id === null ? null : data.metadata.items[row.id];
+                    if (info && info.icon) {
+                        const icon = document.createElement('img');
+                        icon.src = 'https://wow.zamimg.com/images/wow/icons/small/' + encodeURIComponent(info.icon) + '.jpg';
+                        icon.alt = '';
+                        li.appendChild(icon);
+                    }
+                    const name = document.createElement('span');
+                    if (row.id === null) {
+                        name.textContent = row.slot + ': (removed)';
+                    } else {
+                        name.textContent = row.slot + ': ' + (info ? info.name : 'Item ' + row.id)
+                            + (info && info.item_level ? ' (' + info.item_level + ')' : '');
+                        if (info && info.quality) {
+                            name.className = 'quality-' + info.quality;
+                        }
+                    }
+                    li.appendChild(name);
+                    list.appendChild(li);
+                }
+            }
+
+            async function scrapeBatch() {
+                const status = document.getElementById('batch-status');
+                const results = document.getElementById('batch-results');
+                const entries = document.getElementById('batchUrls').value
+                    .split('\\n')
+                    .map(line => line.trim())
+                    .filter(line => line)
+                    .map(line => {
+                        const [url, role] = line.split(/\\s+/);
+                        return {url: url, role: (role || 'dps').toLowerCase()};
+                    });
+
+                if (entries.length === 0) {
+                    alert('Please enter at least one BiS gear URL');
+                    return;
+                }
+
+                results.replaceChildren();
+                let done = 0;
+                status.textContent = '⏳ Scraping 0/' + entries.length + '...';
+
+                // One placeholder per entry so results appear in roster order
+                const rows = entries.map(entry => {
+                    const row = document.createElement('div');
+                    row.className = 'batch-entry';
+                    const loading = document.createElement('div');
+                    loading.className = 'loading';
+                    loading.textContent = '⏳ ' + entry.url + ' (' + entry.role.toUpperCase() + ')';
+                    row.appendChild(loading);
+                    results.appendChild(row);
+                    return row;
+                });
+
+                try {
+                    const response = await fetch('/scrape-batch?stream=1' + importFormatParam(), {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({entries: entries})
+                    });
+
+                    if (!response.body) {
+                        throw new Error('Streaming not supported by this browser');
+                    }
+
+                    // Render each NDJSON line as soon as it arrives
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+
+                    while (true) {
+                        const {value, done: finished} = await reader.read();
+                        if (finished) break;
+
+                        buffer += decoder.decode(value, {stream: true});
+                        const lines = buffer.split('\\n');
+                        buffer = lines.pop();
+
+                        for (const line of lines) {
+                            if (!line) continue;
+                            const data = JSON.parse(line);
+                            if (data.done) {
+                                status.textContent = data.success ? '✅ All done!' : '⚠️ Finished with errors';
+                                continue;
+                            }
+                            renderBatchEntry(rows[data.index], entries[data.index], data);
+                            done++;
+                            status.textContent = '⏳ Scraping ' + done + '/' + entries.length + '...';
+                        }
+                    }
+                } catch (e) {
+                    status.textContent = '❌ Failed to connect to server: ' + e.message;
+                }
+            }
+
+            function renderBatchEntry(row, entry, data) {
+                row.replaceChildren();
+                const title = document.createElement('div');
+                title.className = 'result-title';
+                title.textContent = entry.url.replace(/^.*\\/classes\\//, '') + ' (' + entry.role.toUpperCase() + ')';
+                row.appendChild(title);
+
+                const body = document.createElement('div');
+                body.className = 'item-ids';
+                if (data.success) {
+                    body.textContent = data.import_string;
+                    row.appendChild(body);
+
+                    const btn = document.createElement('button');
+                    btn.className = 'btn btn-copy';
+                    btn.textContent = '📋 Copy Import String';
+                    btn.onclick = (event) => copyText(data.import_string, event.target);
+                    row.appendChild(btn);
+                } else {
+                    row.className = 'batch-entry error';
+                    body.textContent = data.error;
+                    row.appendChild(body);
+                }
+            }
+
             function copyToClipboard(event) {
-                const text = currentImportString;
-                const btn = event.target;
+                copyText(currentImportString, event.target);
+            }
 
+            function copyText(text, btn) {
                 if (!text) {
                     alert('No data to copy! Please scrape items first by clicking a role button.');
                     return;
@@ -774,6 +3914,107 @@ def home():
     </html>
     """
 
+# The home page only changes with the code, so it is rendered and compressed
+# once per worker: encoding -> (body bytes, ETag)
+_home_page_variants = None
+
+def home_page_variants():
+    """Return the home page body and ETag for each content encoding we can send"""
+    global _home_page_variants
+
+    if _home_page_variants is None:
+        body = render_home_page().encode('utf-8')
+        tag = hashlib.sha1(body).hexdigest()[:20]
+        variants = {
+            'identity': (body, tag),
+            'gzip': (gzip.compress(body, compresslevel=9), f'{tag}-gzip'),
+        }
+        if brotli is not None:
+            variants['br'] = (brotli.compress(body, quality=11), f'{tag}-br')
+        _home_page_variants = variants
+    return _home_page_variants
+
+def preferred_encoding(available):
+    """Pick the best content encoding the client accepts out of `available`"""
+    for encoding in ('br', 'gzip'):
+        if encoding in available and request.accept_encodings[encoding] > 0:
+            return encoding
+    return 'identity'
+
+@app.route('/')
+def home():
+    """Home page with role selection"""
+    variants = home_page_variants()
+    encoding = preferred_encoding(variants)
+    body, tag = variants[encoding]
+
+    response = Response(body, mimetype='text/html')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(tag)
+    response.cache_control.public = True
+    response.cache_control.max_age = HOME_MAX_AGE
+    return response.make_conditional(request)
+
+def payload_etag(payload):
+    """ETag value of a scrape payload, ignoring the VOLATILE_RESPONSE_FIELDS"""
+    stable = {name: value for name, value in payload.items() if name not in VOLATILE_RESPONSE_FIELDS}
+    digest = hashlib.sha1(json.dumps(stable, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+def payload_cacheable(payload):
+    """
+    Whether a successful scrape payload may be cached for RESPONSE_MAX_AGE;
+    enriched payloads with metadata still being looked up must be revalidated
+    """
+    return payload.get('metadata_complete') is not False
+
+def json_response(payload, status=200):
+    """
+    jsonify a scrape payload; successful GETs get a weak ETag over the
+    payload without its per-request fields, Cache-Control (no-cache while
+    metadata is incomplete), and a 304 answer when the client already has
+    the same content
+    """
+    response = jsonify(payload)
+    response.status_code = status
+    if status != 200 or request.method != 'GET' or g.get('profile') is not None:
+        return response
+
+    response.set_etag(payload_etag(payload), weak=True)
+    if payload_cacheable(payload):
+        response.cache_control.public = True
+        response.cache_control.max_age = RESPONSE_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def scrape_payload(url, items, gear_fetch):
+    """Build the /scrape payload, returns (payload dict, HTTP status)"""
+    if not items:
+        return {
+            'success': False,
+            'error': 'No items found on that page. Make sure it\'s a BiS guide URL.'
+        }, 404
+
+    return {
+        'success': True,
+        'count': len(items),
+        'items': items,
+        'source_url': url,
+        'cache': {'gear': gear_fetch.get('cache')},
+        **page_freshness(gear_fetch)
+    }, 200
+
+def wants_all_tables():
+    """Whether the request asked for every BiS table of the guide (?tables=all)"""
+    return request.args.get('tables', '').lower() == 'all'
+
+def wants_enrichment():
+    """Whether the request asked for item/enchant metadata (?enrich=1)"""
+    return request.args.get('enrich', '').lower() in ('1', 'true')
+
 @app.route('/scrape')
 def scrape():
     """API endpoint to scrape Wowhead BiS pages"""
@@ -796,26 +4037,26 @@ def scrape():
         }), 400
 
     # Scrape the items
-    items = scrape_wowhead_items(url)
+    gear_fetch = {}
+    items = scrape_wowhead_items(url, gear_fetch)
 
-    if not items:
-        return jsonify({
-            'success': False,
-            'error': 'No items found on that page. Make sure it\'s a BiS guide URL.'
-        }), 404
+    payload, status = scrape_payload(url, items, gear_fetch)
 
-    return jsonify({
-        'success': True,
-        'count': len(items),
-        'items': items,
-        'source_url': url
-    })
+    # Every tab of the guide from the same (already cached) page
+    if status == 200 and wants_all_tables():
+        payload['tables'] = scrape_wowhead_tables(url)
+
+    if status == 200 and wants_enrichment():
+        payload = enrich_payload(payload)
+
+    return json_response(payload, status)
 
 @app.route('/scrape-full')
 def scrape_full():
     """API endpoint to scrape both BiS gear and enchants based on role"""
     url = request.args.get('url', '')
     role = request.args.get('role', 'dps').lower()
+    import_format = request.args.get('format', 'legacy').lower()
 
     if not url:
         return jsonify({
@@ -826,77 +4067,190 @@ def scrape_full():
     # Decode URL if needed
     url = unquote(url)
 
-    # Validate it's a Wowhead URL
-    if 'wowhead.com' not in url:
+    error = check_full_request(url, role, import_format)
+    if error:
         return jsonify({
             'success': False,
-            'error': 'Only Wowhead URLs are supported'
+            'error': error
         }), 400
 
-    # Validate role
-    if role not in ['tank', 'dps', 'healer']:
+    payload, status = get_full_result(url, role)
+    if status != 200:
+        return json_response(payload, status)
+
+    # Every tab of the guide, each with its own import string
+    if wants_all_tables():
+        payload = dict(payload, tables=build_table_results(url, payload['enchants']))
+    remember_payload_imports(payload)
+
+    # Only what changed since the import the client already has
+    since = request.args.get('since', '').lower()
+    previous = request.args.get('previous', '')
+    if since or previous:
+        payload, status = import_update(payload, import_format, since, previous)
+        if status == 204:
+            return import_unchanged_response(payload['import_hash'])
+    else:
+        payload = with_import_format(payload, import_format)
+
+    if status == 200 and wants_enrichment():
+        payload = enrich_payload(payload)
+
+    response = json_response(payload, status)
+    if status == 200:
+        response.headers['X-Import-Hash'] = payload['import_hash']
+    return response
+
+def import_unchanged_response(digest):
+    """Empty 204 answer to ?since/?previous when the import has not changed"""
+    response = Response(status=204)
+    response.headers['X-Import-Hash'] = digest
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Thread pool for /scrape-batch entries (separate from the upstream pool, which
+# the entries themselves use for their gear/enchant fetches)
+_batch_executor = None
+_batch_executor_pid = None
+
+def get_batch_executor():
+    """Return this worker's thread pool for /scrape-batch entries"""
+    global _batch_executor, _batch_executor_pid
+
+    pid = os.getpid()
+    if _batch_executor is not None and _batch_executor_pid == pid:
+        return _batch_executor
+
+    with _upstream_session_lock:
+        if _batch_executor is None or _batch_executor_pid != pid:
+            _batch_executor = ThreadPoolExecutor(
+                max_workers=BATCH_CONCURRENCY,
+                thread_name_prefix='abis-batch',
+            )
+            _batch_executor_pid = pid
+
+    return _batch_executor
+
+@app.route('/scrape-batch', methods=['POST'])
+def scrape_batch():
+    """
+    API endpoint to scrape many guides in one request (e.g. a guild roster)
+
+    Body: {"entries": [{"url": "...bis-gear", "role": "tank|dps|healer"}, ...]}
+    Identical entries are scraped once and unique ones run in parallel.
+    Returns one /scrape-full style result per entry, in request order.
+
+    ?format=compact returns compact import strings for every entry.
+    With ?stream=1 (or Accept: application/x-ndjson) the response is NDJSON:
+    one {"index": i, ...result} line per entry as soon as it is ready, then a
+    final {"done": true, ...} summary line.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('entries') if isinstance(data, dict) else data
+
+    if not isinstance(entries, list) or not entries:
         return jsonify({
             'success': False,
-            'error': 'Role must be tank, dps, or healer'
+            'error': 'Send a JSON body like {"entries": [{"url": "...", "role": "dps"}]}'
         }), 400
 
-    # Scrape BiS gear
-    gear_items = scrape_wowhead_items(url)
-    if not gear_items:
+    if len(entries) > BATCH_MAX_ENTRIES:
         return jsonify({
             'success': False,
-            'error': 'No gear items found on that page. Make sure it\'s a BiS guide URL.'
-        }), 404
-
-    # Scrape enchants - construct URL by replacing bis-gear with enchants-gems-pve-{role}
-    enchant_url = url.replace('bis-gear', f'enchants-gems-pve-{role}')
-    enchants_with_slots = scrape_wowhead_enchants(enchant_url)
-
-    # Allow BiS gear without enchants
-    if not enchants_with_slots:
-        pass  # Silently continue without enchants
-
-    # Create import string format: "BIS##slot:id;slot:id;;ENCHANT##slot:id;slot:id"
-    parts = []
-
-    # Add BiS gear items with slots
-    if gear_items:
-        bis_items = []
-        for item in gear_items:
-            bis_items.append(f"'{item['slot']}':{item['id']}")
-        parts.append("BIS##" + ";".join(bis_items))
-
-    # Add enchants with slots (multiple enchants per slot separated by |)
-    # Format: 'slot':id~context|id~context
-    if enchants_with_slots:
-        enchant_items = []
-        for enchant in enchants_with_slots:
-            # Build enchant options as id~context pairs, joined by |
-            enchant_options = []
-            for enc in enchant['enchants']:
-                if enc['context']:
-                    enchant_options.append(f"{enc['id']}~{enc['context']}")
-                else:
-                    enchant_options.append(str(enc['id']))
+            'error': f'Too many entries (max {BATCH_MAX_ENTRIES})'
+        }), 400
 
-            enchant_str = "|".join(enchant_options)
-            enchant_items.append(f"'{enchant['slot']}':{enchant_str}")
-        parts.append("ENCHANT##" + ";".join(enchant_items))
+    import_format = request.args.get('format', 'legacy').lower()
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': 'Format must be legacy or compact'
+        }), 400
 
-    import_string = ";;".join(parts)
+    # Validate entries and collect the unique scrapes
+    requests_by_key = {}
+    entry_keys = []
+    results = [None] * len(entries)
+
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            entry = {}
+        url = unquote(str(entry.get('url', '')))
+        role = str(entry.get('role', 'dps')).lower()
+
+        error = check_full_request(url, role) if url else 'No URL provided'
+        if error:
+            results[i] = {'success': False, 'error': error, 'gear_url': url, 'role': role}
+            entry_keys.append(None)
+            continue
+
+        key = scrape_result_key(url, role)
+        requests_by_key.setdefault(key, (url, role))
+        entry_keys.append(key)
+
+    executor = get_batch_executor()
+    futures = {
+        key: submit_in_context(executor, get_full_result, url, role)
+        for key, (url, role) in requests_by_key.items()
+    }
+
+    stream = (request.args.get('stream') == '1'
+              or request.accept_mimetypes.best == 'application/x-ndjson')
+    if stream:
+        return Response(
+            stream_with_context(stream_batch_results(futures, entry_keys, results, import_format)),
+            mimetype='application/x-ndjson',
+            headers={'X-Accel-Buffering': 'no'},  # Don't let nginx buffer the stream
+        )
+
+    for i, key in enumerate(entry_keys):
+        if key is not None:
+            results[i] = batch_entry_result(futures[key], import_format)
 
     return jsonify({
-        'success': True,
-        'gear_count': len(gear_items),
-        'enchant_count': len(enchants_with_slots),
-        'gear_items': gear_items,
-        'enchants': enchants_with_slots,
-        'import_string': import_string,
-        'gear_url': url,
-        'enchant_url': enchant_url,
-        'role': role
+        'success': all(result.get('success') for result in results),
+        'count': len(results),
+        'unique_count': len(requests_by_key),
+        'results': results
     })
 
+def batch_entry_result(future, import_format='legacy'):
+    """Payload for a finished /scrape-batch future"""
+    try:
+        payload, status = future.result()
+        payload = with_import_format(payload, import_format)
+    except UpstreamError as e:
+        payload = upstream_error_payload(e)
+    except Exception as e:
+        payload = {'success': False, 'error': f'Scrape failed: {e}'}
+    return payload
+
+def stream_batch_results(futures, entry_keys, results, import_format='legacy'):
+    """
+    Yield /scrape-batch results as NDJSON lines in completion order
+    Entries that failed validation (already in results) are sent first
+    """
+    entries_by_key = {}
+    for i, key in enumerate(entry_keys):
+        if key is None:
+            yield json.dumps(dict(results[i], index=i)) + '\n'
+        else:
+            entries_by_key.setdefault(key, []).append(i)
+
+    keys_by_future = {future: key for key, future in futures.items()}
+    for future in as_completed(keys_by_future):
+        payload = batch_entry_result(future, import_format)
+        for i in entries_by_key[keys_by_future[future]]:
+            results[i] = payload
+            yield json.dumps(dict(payload, index=i)) + '\n'
+
+    yield json.dumps({
+        'done': True,
+        'success': all(result.get('success') for result in results),
+        'count': len(results),
+        'unique_count': len(futures),
+    }) + '\n'
+
 @app.route('/scrape-both')
 def scrape_both():
     """API endpoint to scrape both BiS gear and enchants from separate URLs"""
@@ -931,14 +4285,22 @@ def scrape_both():
 
     # Scrape enchants if URL provided
     enchants = []
+    enchant_fetch = {}
     if enchants_url and 'wowhead.com' in enchants_url:
-        enchants = scrape_wowhead_enchants(enchants_url)
+        enchants = scrape_wowhead_enchants(enchants_url, enchant_fetch)
 
+    payload, status = scrape_both_payload(bis_url, enchants_url, gear_items, enchants, enchant_fetch)
+    if status == 200 and wants_enrichment():
+        payload = enrich_payload(payload)
+    return json_response(payload, status)
+
+def scrape_both_payload(bis_url, enchants_url, gear_items, enchants, enchant_fetch):
+    """Build the /scrape-both payload, returns (payload dict, HTTP status)"""
     if not enchants:
-        return jsonify({
+        return {
             'success': False,
             'error': 'No enchants found. Make sure the enchants URL is correct.'
-        }), 404
+        }, 404
 
     # Create import string format: "GEAR:item1,item2,...|ENCHANTS:spell1,spell2,..."
     gear_string = ','.join(map(str, gear_items))
@@ -951,7 +4313,7 @@ def scrape_both():
     else:
         import_string = f"GEAR:{gear_string}"
 
-    return jsonify({
+    return {
         'success': True,
         'gear_count': len(gear_items),
         'enchant_count': len(enchants),
@@ -959,8 +4321,217 @@ def scrape_both():
         'enchants': enchants,
         'import_string': import_string,
         'gear_url': bis_url,
-        'enchant_url': enchants_url if enchants_url else None
+        'enchant_url': enchants_url if enchants_url else None,
+        'cache': {'gear': None, 'enchants': enchant_fetch.get('cache')},
+        **page_freshness(enchant_fetch)
+    }, 200
+
+def upstream_error_payload(error):
+    """Response body for an UpstreamError"""
+    payload = {
+        'success': False,
+        'error': str(error),
+        'upstream': 'throttled' if isinstance(error, UpstreamThrottled) else 'unavailable',
+    }
+    if error.retry_after is not None:
+        payload['retry_after'] = math.ceil(error.retry_after)
+        payload['error'] += f', try again in {payload["retry_after"]}s'
+    return payload
+
+@app.errorhandler(UpstreamError)
+def upstream_error(error):
+    """Report a throttled or unavailable Wowhead as 429/503 instead of a 404"""
+    payload = upstream_error_payload(error)
+    response = jsonify(payload)
+    response.status_code = error.status
+    if 'retry_after' in payload:
+        response.headers['Retry-After'] = str(payload['retry_after'])
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    gzip JSON and text responses of COMPRESS_MIN_BYTES or more for clients
+    that accept it (registered first, so it runs after the other hooks)
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings['gzip'] <= 0:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started for the latency histogram"""
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def assign_request_id():
+    """Take the correlation id from X-Request-ID (or make one) for this request's logs"""
+    request_id = request.headers.get('X-Request-ID', '')
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    g.request_id = request_id
+    request_id_var.set(request_id)
+    debug_sampled_var.set(random.random() < LOG_DEBUG_SAMPLE)
+
+@app.after_request
+def log_request(response):
+    """Echo the correlation id and write one access log record per request"""
+    request_id = g.get('request_id')
+    if request_id is not None:
+        response.headers['X-Request-ID'] = request_id
+    started = g.get('request_started')
+    logger.info('request', extra={
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'ms': round((time.perf_counter() - started) * 1000, 1) if started is not None else None,
     })
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and observe its latency under its route pattern"""
+    started = g.get('request_started')
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if started is not None:
+        # Streamed responses (NDJSON batches) are timed up to their first byte
+        metrics.observe('abis_http_request_duration_seconds', time.perf_counter() - started, route=route)
+    metrics.inc('abis_http_requests_total', route=route, method=request.method, status=response.status_code)
+    return response
+
+# cProfile can only follow one request at a time
+_cprofile_lock = threading.Lock()
+PROFILE_TOP_FUNCTIONS = 25
+
+@app.before_request
+def start_request_profile():
+    """
+    Start profiling the request when it asks for ?profile=1 (stage timings)
+    or ?profile=cprofile (stage timings plus a cProfile dump)
+    """
+    request_profile_var.set(None)
+    mode = request.args.get('profile', '').lower()
+    if mode in ('', '0', 'false'):
+        return None
+
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({
+            'success': False,
+            'error': 'Profiling requires a valid X-Admin-Token header'
+        }), 403
+
+    profile = {'mode': mode, 'stages': [], 'started': time.perf_counter(), 'inline': False, 'profiler': None}
+    if mode == 'cprofile':
+        if not _cprofile_lock.acquire(blocking=False):
+            return jsonify({
+                'success': False,
+                'error': 'Another request is being profiled, try again shortly'
+            }), 409
+        profile['inline'] = True
+        profile['profiler'] = cProfile.Profile()
+        profile['profiler'].enable()
+
+    g.profile = profile
+    request_profile_var.set(profile)
+    return None
+
+@app.after_request
+def finish_request_profile(response):
+    """Add the profile of a profiled request to its JSON response"""
+    profile = g.get('profile')
+    if profile is None:
+        return response
+
+    stop_request_profile()
+    total = time.perf_counter() - profile['started']
+    if response.status_code == 304:
+        return response
+    if not response.is_json or response.is_streamed:
+        response.headers['X-Profile-Total-Ms'] = f'{total * 1000:.1f}'
+        return response
+
+    payload = response.get_json()
+    started = time.perf_counter()
+    app.json.dumps(payload)  # what jsonify spent turning the payload into text
+    serialize = time.perf_counter() - started
+
+    payload['profile'] = build_profile_report(profile, total, serialize)
+    response.set_data(app.json.dumps(payload))
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc=None):
+    """Stop this request's profiler (also when the request failed)"""
+    profile = g.get('profile')
+    if profile is None:
+        return
+    request_profile_var.set(None)
+    profiler = profile['profiler']
+    if profiler is not None and not profile.get('stopped'):
+        profiler.disable()
+        _cprofile_lock.release()
+    profile['stopped'] = True
+
+def build_profile_report(profile, total, serialize):
+    """
+    Summarize a request profile: total time, time per stage, serialization
+    and (for cprofile) the marshalled pstats plus the top functions
+    """
+    stages = {}
+    for stage, elapsed in profile['stages']:
+        entry = stages.setdefault(stage, {'ms': 0.0, 'count': 0})
+        entry['ms'] += elapsed * 1000
+        entry['count'] += 1
+    for entry in stages.values():
+        entry['ms'] = round(entry['ms'], 3)
+
+    report = {
+        'total_ms': round(total * 1000, 3),
+        'stages': stages,
+        'serialize_ms': round(serialize * 1000, 3),
+        # Without cprofile, gear and enchant stages run in parallel and may overlap
+        'parallel': not profile['inline'],
+    }
+
+    profiler = profile['profiler']
+    if profiler is not None:
+        stats = pstats.Stats(profiler)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        report['cprofile'] = {
+            # Load with pstats/snakeviz/flameprof after base64-decoding to a .prof file
+            'format': 'pstats-marshal',
+            'data': base64.b64encode(marshal.dumps(stats.stats)).decode('ascii'),
+            'top': [
+                {
+                    'function': f'{filename}:{line}({name})',
+                    'calls': calls,
+                    'own_ms': round(own * 1000, 3),
+                    'cumulative_ms': round(cumulative * 1000, 3),
+                }
+                for (filename, line, name), (_, calls, own, cumulative, _) in top
+            ],
+        }
+    return report
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics of all workers (of this worker without the on-disk store)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/health')
 def health():
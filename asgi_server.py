@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""
+ASGI server for AndrewsBISUI
+
+Serves /scrape, /scrape-full and /scrape-both from an event loop with a
+non-blocking pooled upstream client (httpx), so one process keeps hundreds of
+Wowhead requests in flight instead of one per worker thread (?enrich=1
+metadata misses are looked up in the background on the blocking client).
+Responses are the same JSON as api_server.py: pages go through the same
+caches and parsers and payloads through the same builders. Every other route (home page,
+/scrape-batch, /metrics, /health) is the Flask app, mounted as WSGI.
+
+    pip install -r requirements.txt -r requirements-asgi.txt
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from urllib.parse import unquote
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+import api_server
+from api_server import (
+    COMPRESS_MIN_BYTES, LOG_DEBUG_SAMPLE, PAGE_CACHE_HARD_TTL, PAGE_CACHE_TTL,
+    REQUEST_ID_PATTERN, RESPONSE_MAX_AGE, STALE_WHILE_REVALIDATE, UPSTREAM_CHUNK_SIZE,
+    UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_DRAIN_BYTES, UPSTREAM_HEADERS, UPSTREAM_READ_TIMEOUT,
+    UPSTREAM_RETRIES, UPSTREAM_STREAM, UpstreamError, UpstreamUnavailable, backoff_delay,
+    check_upstream_status, debug_sampled_var, logger, metrics, normalize_url, page_cache,
+    page_scanner, parse_bis_guide, parse_enchant_tables, request_id_var, upstream_limiter,
+    upstream_url,
+)
+
+# Upstream connections kept open by the event loop (all requests share them)
+ASYNC_POOL_SIZE = int(os.environ.get('ABIS_ASYNC_POOL_SIZE', '100'))
+
+# httpx only decodes brotli when the brotli package is installed
+ASYNC_UPSTREAM_HEADERS = dict(
+    UPSTREAM_HEADERS,
+    **{'Accept-Encoding': 'gzip, deflate, br' if api_server.brotli is not None else 'gzip, deflate'},
+)
+
+_client = None
+
+@asynccontextmanager
+async def lifespan(app):
+    """Open the pooled upstream client for the life of the server"""
+    global _client
+
+    _client = httpx.AsyncClient(
+        headers=ASYNC_UPSTREAM_HEADERS,
+        timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=ASYNC_POOL_SIZE, max_keepalive_connections=ASYNC_POOL_SIZE),
+        follow_redirects=True,
+    )
+    try:
+        yield
+    finally:
+        await _client.aclose()
+        _client = None
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent awaits that share a key into a single task
+
+    Waiters are shielded from each other: a client that disconnects cancels
+    its own wait, not the download other requests are waiting on.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Task
+
+    async def do(self, key, fn, *args):
+        """Await fn(*args) once per in-flight key, returns (result, shared)"""
+        task = self._calls.get(key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn(*args))
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), False
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every waiter went away
+
+# Identical upstream page downloads and identical /scrape-full requests
+page_flight = AsyncSingleFlight()
+scrape_flight = AsyncSingleFlight()
+
+# Background refreshes in progress (tasks are kept so they are not collected)
+_refresh_tasks = {}
+
+async def fetch_wowhead_page(url, fetch_info=None):
+    """
+    Fetch a Wowhead page through the page caches without blocking the loop
+    Sets the same fetch_info fields as api_server.fetch_wowhead_page
+    """
+    key = normalize_url(url)
+
+    cached = page_cache.get(key)
+    if cached is not None:
+        body, age = cached
+        if age < PAGE_CACHE_TTL or STALE_WHILE_REVALIDATE:
+            stale = age >= PAGE_CACHE_TTL
+            if stale:
+                refresh_page_in_background(key)
+            if fetch_info is not None:
+                fetch_info.update(cache='hit', stale=stale, age=int(age))
+            metrics.inc('abis_cache_lookups_total', cache='page', result='hit')
+            return body
+
+    (body, status, age), shared = await page_flight.do(key, load_wowhead_page, key)
+    metrics.inc('abis_cache_lookups_total', cache='page', result='coalesced' if shared else status)
+
+    if fetch_info is not None:
+        fetch_info.update(
+            cache='coalesced' if shared else status,
+            stale=age >= PAGE_CACHE_TTL,
+            age=int(age),
+        )
+    return body
+
+@asynccontextmanager
+async def store_lock(key):
+    """
+    Hold the shared store's cross-worker lock on key; it is acquired in a
+    thread, so waiting for another worker does not block the loop
+    """
+    lock = api_server.page_store.lock(key)
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.__enter__))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The thread may still get the lock; release it as soon as it does
+        acquiring.add_done_callback(lambda _: lock.__exit__(None, None, None))
+        raise
+    try:
+        yield lock
+    finally:
+        lock.__exit__(None, None, None)
+
+async def load_wowhead_page(key):
+    """
+    Load a page that is not fresh in memory, from the shared store or Wowhead
+    Returns (body bytes, cache status, age in seconds)
+    """
+    page_store = api_server.page_store
+    if page_store is None:
+        return await download_wowhead_page(key, None), 'miss', 0.0
+
+    # Only one worker at a time fetches a given page (the single flight covers
+    # this process); the others wait here and then find it in the shared store
+    async with store_lock(key):
+        # A request served by the mounted Flask app may have loaded it while
+        # we were queued
+        cached = page_cache.get(key)
+        if cached is not None and cached[1] < PAGE_CACHE_TTL:
+            return cached[0], 'hit', cached[1]
+
+        stored = await asyncio.to_thread(page_store.get_page, key)
+        if stored is not None:
+            age = max(0.0, time.time() - stored['checked_at'])
+            if age < PAGE_CACHE_TTL or (STALE_WHILE_REVALIDATE and age < PAGE_CACHE_HARD_TTL):
+                page_cache.put(key, stored['body'], stored['checked_at'])
+                if age >= PAGE_CACHE_TTL:
+                    refresh_page_in_background(key)
+                return stored['body'], 'disk', age
+
+        try:
+            body = await download_wowhead_page(key, stored)
+        except UpstreamError as e:
+            if stored is None or age >= PAGE_CACHE_HARD_TTL:
+                raise
+            logger.warning('Serving stale page, upstream failed', extra={'url': key, 'error': str(e)})
+            page_cache.put(key, stored['body'], stored['checked_at'])
+            return stored['body'], 'disk', age
+
+    status = 'revalidated' if stored is not None and body is stored['body'] else 'miss'
+    return body, status, 0.0
+
+def refresh_page_in_background(key):
+    """Start a background revalidation of a stale page (once per page)"""
+    if key in _refresh_tasks:
+        return
+    task = asyncio.ensure_future(refresh_page(key))
+    _refresh_tasks[key] = task
+    task.add_done_callback(lambda _: _refresh_tasks.pop(key, None))
+
+async def refresh_page(key):
+    """Revalidate a stale page with Wowhead, updating both caches"""
+    try:
+        stored = None
+        if api_server.page_store is not None:
+            stored = await asyncio.to_thread(api_server.page_store.get_page, key)
+            if stored is not None and time.time() - stored['checked_at'] < PAGE_CACHE_TTL:
+                # Another worker already refreshed it
+                page_cache.put(key, stored['body'], stored['checked_at'])
+                return
+        await download_wowhead_page(key, stored)
+    except Exception as e:
+        logger.warning('Background refresh failed', extra={'url': key, 'error': str(e)})
+
+async def read_page_body(response, scanner):
+    """
+    Read a streamed response until the scanner has seen everything the
+    parsers need (see api_server.read_page_body)
+    """
+    body = bytearray()
+    end = None
+
+    chunks = response.aiter_bytes(chunk_size=UPSTREAM_CHUNK_SIZE)
+    async for chunk in chunks:
+        body += chunk
+        end = scanner.feed(body)
+        if end is not None:
+            break
+
+    if end is None:
+        return bytes(body)
+
+    # Finish small remainders so the connection is reused; leaving the
+    # stream unread makes httpx drop the connection when it is closed
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        if int(content_length) - response.num_bytes_downloaded <= UPSTREAM_DRAIN_BYTES:
+            async for _ in chunks:
+                pass
+
+    logger.debug('Stopped reading page early', extra={'url': str(response.url), 'bytes': len(body)})
+    del body[end:]
+    return bytes(body)
+
+async def download_wowhead_page(key, stored):
+    """
+    Download a page from Wowhead and store it in the page caches, through
+    the shared upstream limiter and with the same retries as
+    api_server.download_wowhead_page
+    """
+    headers = {}
+    if stored is not None:
+        if stored['etag']:
+            headers['If-None-Match'] = stored['etag']
+        if stored['last_modified']:
+            headers['If-Modified-Since'] = stored['last_modified']
+
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        try:
+            wait = await asyncio.to_thread(upstream_limiter.reserve)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                body = await request_wowhead_page(key, stored, headers)
+            except UpstreamError as e:
+                await asyncio.to_thread(upstream_limiter.record, e)
+                raise
+            except Exception:
+                await asyncio.to_thread(upstream_limiter.record)
+                raise
+            await asyncio.to_thread(upstream_limiter.record)
+            return body
+        except UpstreamError as e:
+            if not e.retryable or attempt == UPSTREAM_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            metrics.inc('abis_upstream_retries_total')
+            logger.info('Retrying upstream request', extra={'url': key, 'error': str(e), 'seconds': round(delay, 2)})
+            await asyncio.sleep(delay)
+
+async def request_wowhead_page(key, stored, headers):
+    """Send one request for a page (see download_wowhead_page)"""
+    page_store = api_server.page_store
+    try:
+        with metrics.timer('abis_stage_duration_seconds', stage='fetch'):
+            async with _client.stream('GET', upstream_url(key), headers=headers) as response:
+                metrics.inc('abis_upstream_responses_total', status=response.status_code)
+                if response.status_code == 304 and stored is not None:
+                    await asyncio.to_thread(page_store.touch_page, key)
+                    page_cache.put(key, stored['body'])
+                    return stored['body']
+
+                check_upstream_status(response.status_code, response.headers)
+                response.raise_for_status()
+
+                if UPSTREAM_STREAM:
+                    body = await read_page_body(response, page_scanner(key))
+                else:
+                    body = await response.aread()
+                metrics.inc('abis_upstream_bytes_total', response.num_bytes_downloaded or len(body))
+    except httpx.TransportError as e:
+        metrics.inc('abis_upstream_responses_total', status='error')
+        raise UpstreamUnavailable('Could not reach Wowhead', retryable=True) from e
+
+    page_cache.put(key, body)
+    if page_store is not None:
+        await asyncio.to_thread(
+            page_store.put_page, key, body, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+        )
+    return body
+
+async def get_parsed_page(url, parser, fetch_info=None):
+    """Fetch a page and parse it off the event loop (see api_server.get_parsed_page)"""
+    body = await fetch_wowhead_page(url, fetch_info)
+    return await asyncio.to_thread(api_server.parse_page_body, normalize_url(url), body, parser)
+
+async def scrape_wowhead_items(url, fetch_info=None):
+    """Async api_server.scrape_wowhead_items"""
+    try:
+        return api_server.bis_table_items(await get_parsed_page(url, parse_bis_guide, fetch_info), url)
+
+    except UpstreamError:
+        raise
+    except Exception as e:
+        api_server.record_scrape_failure(url, e, fetch_info)
+        return []
+
+async def scrape_wowhead_tables(url, fetch_info=None):
+    """Async api_server.scrape_wowhead_tables"""
+    try:
+        return api_server.bis_table_summaries(await get_parsed_page(url, parse_bis_guide, fetch_info))
+
+    except UpstreamError:
+        raise
+    except Exception as e:
+        api_server.record_scrape_failure(url, e, fetch_info)
+        return []
+
+async def scrape_wowhead_enchants(url, fetch_info=None):
+    """Async api_server.scrape_wowhead_enchants"""
+    try:
+        return api_server.enchant_slots(await get_parsed_page(url, parse_enchant_tables, fetch_info))
+
+    except UpstreamError:
+        raise
+    except Exception as e:
+        api_server.record_scrape_failure(url, e, fetch_info)
+        return []
+
+async def get_full_result(url, role):
+    """
+    Return (payload, status) for a validated /scrape-full request, using a
+    precomputed result when available and sharing in-flight identical scrapes
+    """
+    precomputed = await asyncio.to_thread(api_server.get_precomputed_result, url, role)
+    if precomputed is not None:
+        return precomputed, 200
+
+    result, shared = await scrape_flight.do(api_server.scrape_result_key(url, role), build_full_result, url, role)
+    payload, status = result
+    if shared:
+        payload = dict(payload, coalesced=True)
+    return payload, status
+
+async def build_full_result(url, role):
+    """Scrape BiS gear and role enchants concurrently and build the /scrape-full payload"""
+    gear_fetch = {}
+    enchant_fetch = {}
+    gear_items, enchants_with_slots = await asyncio.gather(
+        scrape_wowhead_items(url, gear_fetch),
+        scrape_wowhead_enchants(api_server.role_enchant_url(url, role), enchant_fetch),
+    )
+
+    payload, status = api_server.full_result_payload(
+        url, role, gear_items, enchants_with_slots, gear_fetch, enchant_fetch,
+    )
+
+    page_store = api_server.page_store
+    if page_store is not None and api_server.result_storable(payload, status, gear_fetch, enchant_fetch):
+        key = json.dumps(api_server.scrape_result_key(url, role))
+        await asyncio.to_thread(page_store.put_result, key, payload)
+
+    return payload, status
+
+def accepts_gzip(request):
+    """Whether the client listed gzip in Accept-Encoding (without q=0)"""
+    for part in request.headers.get('accept-encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0')
+    return False
+
+def etag_matches(request, etag):
+    """Weak comparison of an ETag with the request's If-None-Match"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return '*' in tags or f'"{etag}"' in tags
+
+def json_response(request, payload, status=200):
+    """
+    Serialize a payload like jsonify does, with the same ETag, Cache-Control,
+    304 and gzip handling as the Flask app
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+    if status == 200 and request.method == 'GET':
+        etag = api_server.payload_etag(payload)
+        headers['ETag'] = f'W/"{etag}"'
+        if api_server.payload_cacheable(payload):
+            headers['Cache-Control'] = f'public, max-age={RESPONSE_MAX_AGE}'
+        else:
+            headers['Cache-Control'] = 'no-cache'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    body = (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+    if len(body) >= COMPRESS_MIN_BYTES and accepts_gzip(request):
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+def error_response(request, message, status):
+    return json_response(request, {'success': False, 'error': message}, status)
+
+def upstream_error_response(request, error):
+    """429/503 response for an UpstreamError, like the Flask error handler"""
+    payload = api_server.upstream_error_payload(error)
+    response = json_response(request, payload, error.status)
+    if 'retry_after' in payload:
+        response.headers['Retry-After'] = str(payload['retry_after'])
+    return response
+
+def observed(endpoint, route):
+    """
+    Wrap an endpoint with the Flask app's per-request hooks: correlation id,
+    access log record and request metrics
+    """
+    async def handle(request):
+        started = time.perf_counter()
+        request_id = request.headers.get('x-request-id', '')
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        request_id_var.set(request_id)
+        debug_sampled_var.set(random.random() < LOG_DEBUG_SAMPLE)
+
+        try:
+            response = await endpoint(request)
+        except UpstreamError as e:
+            response = upstream_error_response(request, e)
+
+        elapsed = time.perf_counter() - started
+        response.headers['X-Request-ID'] = request_id
+        logger.info('request', extra={
+            'method': request.method,
+            'path': request.url.path,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 1),
+        })
+        metrics.observe('abis_http_request_duration_seconds', elapsed, route=route)
+        metrics.inc('abis_http_requests_total', route=route, method=request.method, status=response.status_code)
+        return response
+
+    return handle
+
+def wants_all_tables(request):
+    """Whether the request asked for every BiS table of the guide (?tables=all)"""
+    return request.query_params.get('tables', '').lower() == 'all'
+
+def wants_enrichment(request):
+    """Whether the request asked for item/enchant metadata (?enrich=1)"""
+    return request.query_params.get('enrich', '').lower() in ('1', 'true')
+
+async def scrape(request):
+    """Async /scrape"""
+    url = request.query_params.get('url', '')
+    if not url:
+        return error_response(request, 'No URL provided. Use ?url=YOUR_WOWHEAD_URL', 400)
+
+    url = unquote(url)
+    if 'wowhead.com' not in url:
+        return error_response(request, 'Only Wowhead URLs are supported', 400)
+
+    gear_fetch = {}
+    items = await scrape_wowhead_items(url, gear_fetch)
+    payload, status = api_server.scrape_payload(url, items, gear_fetch)
+
+    if status == 200 and wants_all_tables(request):
+        payload['tables'] = await scrape_wowhead_tables(url)
+
+    # Metadata comes from the shared store (a blocking read); misses are
+    # looked up in the background
+    if status == 200 and wants_enrichment(request):
+        payload = await asyncio.to_thread(api_server.enrich_payload, payload)
+
+    return json_response(request, payload, status)
+
+async def scrape_full(request):
+    """Async /scrape-full"""
+    url = request.query_params.get('url', '')
+    role = request.query_params.get('role', 'dps').lower()
+    import_format = request.query_params.get('format', 'legacy').lower()
+    if not url:
+        return error_response(request, 'No URL provided. Use ?url=YOUR_WOWHEAD_URL&role=tank|dps|healer', 400)
+
+    url = unquote(url)
+    error = api_server.check_full_request(url, role, import_format)
+    if error:
+        return error_response(request, error, 400)
+
+    payload, status = await get_full_result(url, role)
+    if status != 200:
+        return json_response(request, payload, status)
+
+    if wants_all_tables(request):
+        tables = await scrape_wowhead_tables(url)
+        payload = dict(payload, tables=api_server.add_table_import_strings(tables, payload['enchants']))
+    await asyncio.to_thread(api_server.remember_payload_imports, payload)
+
+    since = request.query_params.get('since', '').lower()
+    previous = request.query_params.get('previous', '')
+    if since or previous:
+        payload, status = await asyncio.to_thread(api_server.import_update, payload, import_format, since, previous)
+        if status == 204:
+            return Response(status_code=204, headers={
+                'X-Import-Hash': payload['import_hash'],
+                'Cache-Control': 'no-cache',
+            })
+    else:
+        payload = api_server.with_import_format(payload, import_format)
+
+    if status == 200 and wants_enrichment(request):
+        payload = await asyncio.to_thread(api_server.enrich_payload, payload)
+
+    response = json_response(request, payload, status)
+    if status == 200:
+        response.headers['X-Import-Hash'] = payload['import_hash']
+    return response
+
+async def scrape_both(request):
+    """Async /scrape-both (gear scraping is disabled there, as in the Flask route)"""
+    bis_url = request.query_params.get('bisUrl', '')
+    enchants_url = request.query_params.get('enchantsUrl', '')
+    if not bis_url:
+        return error_response(request, 'No BiS URL provided', 400)
+
+    bis_url = unquote(bis_url)
+    enchants_url = unquote(enchants_url) if enchants_url else ''
+    if 'wowhead.com' not in bis_url:
+        return error_response(request, 'Only Wowhead URLs are supported', 400)
+
+    enchants = []
+    enchant_fetch = {}
+    if enchants_url and 'wowhead.com' in enchants_url:
+        enchants = await scrape_wowhead_enchants(enchants_url, enchant_fetch)
+
+    payload, status = api_server.scrape_both_payload(bis_url, enchants_url, [], enchants, enchant_fetch)
+    if status == 200 and wants_enrichment(request):
+        payload = await asyncio.to_thread(api_server.enrich_payload, payload)
+    return json_response(request, payload, status)
+
+app = Starlette(
+    routes=[
+        Route('/scrape', observed(scrape, '/scrape')),
+        Route('/scrape-full', observed(scrape_full, '/scrape-full')),
+        Route('/scrape-both', observed(scrape_both, '/scrape-both')),
+        Mount('/', app=WSGIMiddleware(api_server.app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'])],
+    lifespan=lifespan,
+)
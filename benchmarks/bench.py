@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the AndrewsBISUI API server
+
+Runs the parsers and /scrape-full against the saved Wowhead pages in
+benchmarks/fixtures, without any network access:
+
+- parse:      parse_bis_guide / parse_enchant_tables on each page
+              (time per run, MB/s, peak and retained allocations)
+- scrape:     scrape_wowhead_items / scrape_wowhead_enchants with the page
+              already cached (the per-request cost once a guide is warm)
+- scrape-full: end-to-end /scrape-full through the Flask test client, cold
+              (empty caches) and warm
+
+Results are written to benchmarks/results/<version>-<commit>.json and
+compared with the newest earlier results file (or --baseline); slowdowns
+beyond --threshold are reported as regressions. Commit the results file of
+a release to keep it as the baseline for the next one.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --iterations 200 --fail-on-regression
+    python benchmarks/bench.py --baseline benchmarks/results/1.1.0-abc1234.json
+    python benchmarks/bench.py --record    # re-download the fixture pages from wowhead.com
+"""
+
+import argparse
+import glob
+import gzip
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# The benchmarks must not touch the shared on-disk cache, start the crawler,
+# rate-limit the (local) fixture requests or log every request
+os.environ['ABIS_CACHE_DIR'] = ''
+os.environ['ABIS_PREWARM_INTERVAL'] = '0'
+os.environ['ABIS_UPSTREAM_RATE'] = '0'
+os.environ.setdefault('ABIS_LOG_LEVEL', 'WARNING')
+sys.path.insert(0, REPO_DIR)
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.models import Response
+
+import api_server
+
+# Metrics compared against the baseline (lower is better for all of them)
+COMPARED_METRICS = ('median_ms', 'p95_ms', 'peak_kib')
+
+
+def load_manifest():
+    """Return the fixture entries from fixtures/manifest.json"""
+    with open(os.path.join(FIXTURE_DIR, 'manifest.json')) as f:
+        return json.load(f)['fixtures']
+
+
+def load_fixture(entry):
+    """Return the raw page bytes of a fixture"""
+    with gzip.open(os.path.join(FIXTURE_DIR, entry['file']), 'rb') as f:
+        return f.read()
+
+
+def record_fixtures(fixtures):
+    """Download every fixture URL from Wowhead and overwrite the saved pages"""
+    session = requests.Session()
+    session.headers.update(api_server.UPSTREAM_HEADERS)
+    for entry in fixtures:
+        response = session.get(entry['url'], timeout=30)
+        response.raise_for_status()
+        with gzip.open(os.path.join(FIXTURE_DIR, entry['file']), 'wb', compresslevel=9) as f:
+            f.write(response.content)
+        print(f"Recorded {entry['name']} ({len(response.content)} bytes)")
+
+
+class FixtureAdapter(BaseAdapter):
+    """Transport adapter answering Wowhead URLs with the saved fixture pages"""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages  # normalized URL -> body bytes
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = self.pages.get(api_server.normalize_url(request.url))
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.status_code = 200 if body is not None else 404
+        body = body or b''
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        response.headers['Content-Length'] = str(len(body))
+        response.raw = io.BytesIO(body)
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def install_fixture_adapter(fixtures, bodies):
+    """Serve all upstream requests of this process from the fixtures"""
+    pages = {api_server.normalize_url(entry['url']): bodies[entry['name']] for entry in fixtures}
+    session = api_server.get_upstream_session()
+    adapter = FixtureAdapter(pages)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def time_calls(fn, iterations, warmup=3):
+    """Run fn repeatedly and return its timing summary in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'iterations': iterations,
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(percentile(samples, 0.95), 4),
+        'min_ms': round(min(samples), 4),
+    }
+
+
+def measure_allocations(fn):
+    """Return peak and retained allocations (KiB) of one call of fn"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        'peak_kib': round((peak - before) / 1024, 1),
+        'retained_kib': round((after - before) / 1024, 1),
+    }
+
+
+def check_expectations(entry, parsed):
+    """Make sure a parser still finds what the fixture is known to contain"""
+    expect = entry.get('expect', {})
+    if entry['kind'] == 'gear':
+        found = {'tables': len(parsed), 'items': len(parsed[0]['items']) if parsed else 0}
+    else:
+        found = {'slots': len(parsed)}
+    for name, value in expect.items():
+        if found.get(name) != value:
+            raise SystemExit(f"{entry['name']}: expected {value} {name}, parser found {found.get(name)}")
+
+
+def bench_parsers(fixtures, bodies, iterations):
+    """Parser throughput and allocations per fixture page"""
+    results = {}
+    for entry in fixtures:
+        body = bodies[entry['name']]
+        parser = api_server.parse_bis_guide if entry['kind'] == 'gear' else api_server.parse_enchant_tables
+        check_expectations(entry, parser(body))
+
+        result = time_calls(lambda: parser(body), iterations)
+        result['mb_per_s'] = round(len(body) / 1e6 / (result['median_ms'] / 1000), 1)
+        result['page_bytes'] = len(body)
+        result.update(measure_allocations(lambda: parser(body)))
+        results[f"parse/{entry['name']}"] = result
+    return results
+
+
+def bench_cached_scrapes(fixtures, iterations):
+    """scrape_wowhead_items/enchants once the page and its tables are cached"""
+    results = {}
+    for entry in fixtures:
+        scrape = api_server.scrape_wowhead_items if entry['kind'] == 'gear' else api_server.scrape_wowhead_enchants
+        url = entry['url']
+        scrape(url)  # fetch and parse once
+        result = time_calls(lambda: scrape(url), iterations)
+        result.update(measure_allocations(lambda: scrape(url)))
+        results[f"scrape/{entry['name']}"] = result
+    return results
+
+
+def bench_scrape_full(fixtures, iterations):
+    """End-to-end /scrape-full latency through the Flask test client"""
+    client = api_server.app.test_client()
+    saved_urls = {api_server.normalize_url(entry['url']) for entry in fixtures}
+    results = {}
+    for entry in fixtures:
+        if entry['kind'] != 'gear' or 'role' not in entry:
+            continue
+        # Only guides whose role enchant page is saved as well
+        enchant_url = entry['url'].replace('bis-gear', f"enchants-gems-pve-{entry['role']}")
+        if api_server.normalize_url(enchant_url) not in saved_urls:
+            continue
+        path = f"/scrape-full?url={entry['url']}&role={entry['role']}"
+
+        def request_once():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise SystemExit(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+        def cold_request():
+            api_server.page_cache.clear()
+            request_once()
+
+        results[f"scrape-full-cold/{entry['name']}"] = time_calls(cold_request, max(5, iterations // 5), warmup=1)
+        results[f"scrape-full-warm/{entry['name']}"] = time_calls(request_once, iterations)
+    return results
+
+
+def current_version():
+    """Addon version from the .toc plus the current git commit, e.g. '1.1.0-abc1234'"""
+    version = 'unknown'
+    with open(os.path.join(REPO_DIR, 'AndrewsBISUI.toc'), encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('## Version:'):
+                version = line.split(':', 1)[1].strip()
+                break
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'nogit'
+    return f'{version}-{commit}'
+
+
+def find_baseline():
+    """Return the newest results file, or None"""
+    paths = glob.glob(os.path.join(RESULTS_DIR, '*.json'))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def compare(results, baseline, threshold):
+    """Return a list of (benchmark, metric, old, new) regressions"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for api_server.py')
+    parser.add_argument('--iterations', type=int, default=50, help='timed runs per benchmark (default 50)')
+    parser.add_argument('--baseline', help='results file to compare against (default: the previous run)')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed slowdown before reporting a regression (default 0.15)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 when a regression is found')
+    parser.add_argument('--output', help='results file to write (default: benchmarks/results/<version>.json)')
+    parser.add_argument('--record', action='store_true', help='re-download the fixture pages from wowhead.com and exit')
+    args = parser.parse_args()
+
+    fixtures = load_manifest()
+    if args.record:
+        record_fixtures(fixtures)
+        return 0
+
+    bodies = {entry['name']: load_fixture(entry) for entry in fixtures}
+    install_fixture_adapter(fixtures, bodies)
+
+    results = {}
+    results.update(bench_parsers(fixtures, bodies, args.iterations))
+    results.update(bench_cached_scrapes(fixtures, args.iterations))
+    results.update(bench_scrape_full(fixtures, args.iterations))
+
+    for name, result in results.items():
+        extra = f"  {result['mb_per_s']:7.1f} MB/s" if 'mb_per_s' in result else ''
+        allocs = f"  peak {result['peak_kib']:8.1f} KiB" if 'peak_kib' in result else ''
+        print(f"{name:62} {result['median_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms{extra}{allocs}")
+
+    # Picked before writing, so a second run of the same version compares
+    # against the first one
+    baseline_path = args.baseline or find_baseline()
+    baseline = None
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    version = current_version()
+    output = args.output or os.path.join(RESULTS_DIR, f'{version}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'version': version,
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f'\nResults written to {os.path.relpath(output)}')
+
+    if baseline is None:
+        print('No previous results to compare against')
+        return 0
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    print(f"Compared with {baseline['version']} ({os.path.relpath(baseline_path)}): ", end='')
+    if not regressions:
+        print('no regressions')
+        return 0
+
+    print(f'{len(regressions)} regression(s)')
+    for name, metric, old, new in regressions:
+        print(f'  {name} {metric}: {old} -> {new} ({(new / old - 1) * 100:+.0f}%)')
+    return 1 if args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
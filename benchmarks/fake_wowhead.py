@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for wowhead.com, serving the saved fixture pages
+
+Point the API server at it with ABIS_UPSTREAM_BASE_URL, e.g.
+
+    python benchmarks/fake_wowhead.py --port 8081 --latency 150 --jitter 50 --error-rate 0.01 --throttle-rate 0.02
+    ABIS_UPSTREAM_BASE_URL=http://127.0.0.1:8081 gunicorn -w 4 api_server:app
+
+Guide paths with a saved page get that page; any other
+/guide/classes/<class>/<spec>/bis-gear or .../enchants-gems-pve-<role> path
+gets a saved page of the same kind, so every class/spec can be requested.
+Responses carry an ETag and answer If-None-Match with 304, and are sent
+gzip-encoded when the client accepts it, like the real site.
+
+/tooltip/item/<id> and /tooltip/spell/<id> answer like the Wowhead tooltip
+API with made-up names, icons and item levels (ids below 1000 are unknown
+and get a 404), for ?enrich=1.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TOOLTIP_PATH = re.compile(r'/tooltip/(item|spell)/(\d+)')
+
+
+class FixturePages:
+    """Fixture pages by URL path, with a fallback page per kind"""
+
+    def __init__(self, fixture_dir):
+        with open(os.path.join(fixture_dir, 'manifest.json')) as f:
+            fixtures = json.load(f)['fixtures']
+
+        self.pages = {}     # path -> (gzipped body, etag)
+        self.fallback = {}  # kind -> (gzipped body, etag)
+        for entry in fixtures:
+            with open(os.path.join(fixture_dir, entry['file']), 'rb') as f:
+                compressed = f.read()
+            page = (compressed, '"%08x"' % zlib.crc32(compressed))
+            self.pages[urlsplit(entry['url']).path] = page
+            self.fallback.setdefault(entry['kind'], page)
+
+    def get(self, path):
+        """Return (gzipped body, etag) for a path, or None"""
+        page = self.pages.get(path)
+        if page is not None:
+            return page
+        if path.startswith('/guide/') and path.endswith('/bis-gear'):
+            return self.fallback.get('gear')
+        if path.startswith('/guide/') and '/enchants-gems-pve-' in path:
+            return self.fallback.get('enchants')
+        return None
+
+
+class FakeWowheadHandler(BaseHTTPRequestHandler):
+    """Serves fixture pages with the configured latency and failure rates"""
+
+    server_version = 'FakeWowhead/1.0'
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real upstream
+
+    def do_GET(self):
+        options = self.server.options
+        delay = max(0.0, random.gauss(options.latency, options.jitter)) / 1000 if options.jitter else options.latency / 1000
+        time.sleep(delay)
+
+        roll = random.random()
+        if roll < options.throttle_rate:
+            self.server.count('429')
+            self.send_error_page(429, 'Too Many Requests', {'Retry-After': str(options.retry_after)})
+            return
+        if roll < options.throttle_rate + options.error_rate:
+            status = random.choice((500, 502, 503))
+            self.server.count(str(status))
+            self.send_error_page(status, 'Upstream error')
+            return
+
+        path = urlsplit(self.path).path
+        tooltip = TOOLTIP_PATH.fullmatch(path)
+        if tooltip:
+            self.send_tooltip(tooltip.group(1), int(tooltip.group(2)))
+            return
+
+        page = self.server.pages.get(path)
+        if page is None:
+            self.server.count('404')
+            self.send_error_page(404, 'Not Found')
+            return
+
+        compressed, etag = page
+        if self.headers.get('If-None-Match') == etag:
+            self.server.count('304')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = compressed
+            encoding = 'gzip'
+        else:
+            body = gzip.decompress(compressed)
+            encoding = None
+
+        self.server.count('200')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the API server stops reading once it has the guide markup
+
+    def send_tooltip(self, kind, item_id):
+        if item_id < 1000:
+            self.server.count('404')
+            self.send_json(404, {'error': f'{kind} not found'})
+            return
+
+        self.server.count('200')
+        if kind == 'item':
+            self.send_json(200, {
+                'name': f'Fake Item {item_id}',
+                'quality': 4,
+                'icon': f'inv_fake_{item_id % 100}',
+                'tooltip': f'<table><tr><td><b class="q4">Fake Item {item_id}</b><br>'
+                           f'Item Level <!--ilvl-->{600 + item_id % 50}</td></tr></table>',
+            })
+        else:
+            self.send_json(200, {
+                'name': f'Fake Enchant {item_id}',
+                'icon': 'inv_misc_enchantedscroll',
+                'tooltip': f'<table><tr><td><b>Fake Enchant {item_id}</b></td></tr></table>',
+            })
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_page(self, status, message, headers=None):
+        body = f'<html><body><h1>{status} {message}</h1></body></html>'.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+
+class FakeWowheadServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, FakeWowheadHandler)
+        self.options = options
+        self.pages = FixturePages(options.fixtures)
+        self.status_counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, status):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local wowhead.com stand-in serving the benchmark fixtures')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=100.0, help='mean response delay in ms (default 100)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='standard deviation of the delay in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500/502/503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=5, help='Retry-After seconds sent with 429 responses')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help='directory with manifest.json and the saved pages')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    options = parser.parse_args()
+
+    server = FakeWowheadServer((options.host, options.port), options)
+    print(f'Fake Wowhead on http://{options.host}:{options.port} '
+          f'(latency {options.latency:g}±{options.jitter:g} ms, errors {options.error_rate:.1%}, 429s {options.throttle_rate:.1%})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'Responses by status: {json.dumps(server.status_counts, sort_keys=True)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
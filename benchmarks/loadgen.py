@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Load generator for a running API server
+
+Sends /scrape, /scrape-full and /scrape-both requests at a fixed target rate
+(open loop: requests are scheduled on the clock, so a slow server shows up as
+latency instead of a lower send rate) and reports throughput and
+p50/p95/p99 latency per endpoint.
+
+    python benchmarks/fake_wowhead.py --latency 150 --jitter 50 &
+    ABIS_UPSTREAM_BASE_URL=http://127.0.0.1:8081 gunicorn -w 4 -b 127.0.0.1:5000 api_server:app &
+    python benchmarks/loadgen.py --target http://127.0.0.1:5000 --rps 50 --duration 60
+
+Guide URLs cover every class/spec in api_server.SPEC_GUIDES with a few tab
+anchors, so the run mixes cache hits and misses like real traffic.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ANCHORS = ('', '#bis-items-overall', '#bis-items-raid', '#bis-items-mythic-plus')
+ENDPOINTS = ('scrape', 'scrape-full', 'scrape-both')
+
+
+def guide_entries():
+    """Return (gear URL, role) for every class/spec guide the server knows"""
+    # Only the guide list is needed - keep the import from touching the cache
+    os.environ.setdefault('ABIS_CACHE_DIR', '')
+    os.environ.setdefault('ABIS_LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, REPO_DIR)
+    import api_server
+
+    return [
+        (api_server.spec_guide_url(class_slug, spec_slug), role)
+        for class_slug, spec_slug, role in api_server.SPEC_GUIDES
+    ]
+
+
+def parse_mix(text):
+    """Parse 'scrape=1,scrape-full=3' into endpoint weights"""
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'unknown endpoint {name!r} (choose from {", ".join(ENDPOINTS)})')
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def build_request(endpoint, guides):
+    """Return the path and query parameters of one random request"""
+    url, role = random.choice(guides)
+    if endpoint == 'scrape':
+        return '/scrape', {'url': url + random.choice(ANCHORS)}
+    if endpoint == 'scrape-full':
+        return '/scrape-full', {'url': url + random.choice(ANCHORS), 'role': role}
+    return '/scrape-both', {'bisUrl': url, 'enchantsUrl': url.replace('bis-gear', f'enchants-gems-pve-{role}')}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class LoadRun:
+    """Collects per-endpoint latencies and statuses from the worker threads"""
+
+    def __init__(self):
+        self.samples = {}  # endpoint -> list of (latency ms, status)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, target, endpoint, path, params, scheduled_at, timeout):
+        try:
+            response = self.session().get(target + path, params=params, timeout=timeout)
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        # Latency counts from when the request was due, including any queueing
+        latency = (time.perf_counter() - scheduled_at) * 1000
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((latency, status))
+
+    def summary(self, elapsed):
+        """Return per-endpoint and overall throughput and latency statistics"""
+        report = {}
+        everything = []
+        for endpoint, samples in sorted(self.samples.items()):
+            report[endpoint] = summarize(samples, elapsed)
+            everything.extend(samples)
+        report['all'] = summarize(everything, elapsed)
+        return report
+
+
+def summarize(samples, elapsed):
+    latencies = [latency for latency, _ in samples]
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = statuses.get('200', 0)
+    if not latencies:
+        return {'requests': 0}
+    return {
+        'requests': len(samples),
+        'ok': ok,
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'ok_rps': round(ok / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'p99_ms': round(percentile(latencies, 0.99), 1),
+        'mean_ms': round(statistics.fmean(latencies), 1),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive an API server at a target request rate')
+    parser.add_argument('--target', default='http://127.0.0.1:5000', help='API server base URL')
+    parser.add_argument('--rps', type=float, default=20.0, help='requests per second to send (default 20)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to send for (default 30)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('scrape=1,scrape-full=3,scrape-both=1'),
+                        help='endpoint weights (default scrape=1,scrape-full=3,scrape-both=1)')
+    parser.add_argument('--concurrency', type=int, default=64, help='maximum requests in flight (default 64)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout in seconds')
+    parser.add_argument('--guides', type=int, default=0, help='only use the first N class/spec guides (0 = all)')
+    parser.add_argument('--seed', type=int, help='random seed for a repeatable request sequence')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    guides = guide_entries()
+    if args.guides:
+        guides = guides[:args.guides]
+    endpoints = list(args.mix)
+    weights = [args.mix[name] for name in endpoints]
+    target = args.target.rstrip('/')
+
+    run = LoadRun()
+    total = int(args.rps * args.duration)
+    print(f'Sending {total} requests to {target} at {args.rps:g} rps over {len(guides)} guides...')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='loadgen') as pool:
+        for i in range(total):
+            scheduled_at = started + i / args.rps
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            endpoint = random.choices(endpoints, weights)[0]
+            path, params = build_request(endpoint, guides)
+            pool.submit(run.send, target, endpoint, path, params, scheduled_at, args.timeout)
+    elapsed = time.perf_counter() - started
+
+    report = run.summary(elapsed)
+    print(f"\n{'endpoint':14} {'requests':>8} {'rps':>7} {'ok rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for endpoint, stats in report.items():
+        if not stats['requests']:
+            continue
+        print(f"{endpoint:14} {stats['requests']:8} {stats['throughput_rps']:7} {stats['ok_rps']:7} "
+              f"{stats['p50_ms']:9} {stats['p95_ms']:9} {stats['p99_ms']:9}  {json.dumps(stats['statuses'], sort_keys=True)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'target': target, 'rps': args.rps, 'duration': args.duration, 'elapsed': round(elapsed, 2), 'report': report}, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())